@@ -6,14 +6,21 @@ from tinkoff.invest.utils import quotation_to_decimal
 logger = logging.getLogger(__name__)
 
 class AccountService:
-    def __init__(self, token: str):
+    def __init__(self, token: str, client_provider=None):
         self.token = token
+        # Поставщик общего gRPC-клиента; без него соединение на вызов
+        self._client_provider = client_provider
+
+    def _connect(self):
+        if self._client_provider is not None:
+            return self._client_provider()
+        return AsyncClient(self.token)
 
     async def get_all_accounts(self) -> List[Dict]:
         """Получение списка всех счетов пользователя с информацией о портфеле"""
         try:
             logger.info("Getting accounts from Tinkoff API")
-            async with AsyncClient(self.token) as client:
+            async with self._connect() as client:
                 response = await client.users.get_accounts()
                 accounts = []
                 
@@ -51,7 +58,7 @@ class AccountService:
         """Проверка, что счет существует и доступен"""
         try:
             logger.info(f"Validating account {account_id}")
-            async with AsyncClient(self.token) as client:
+            async with self._connect() as client:
                 accounts = await client.users.get_accounts()
                 account_ids = [account.id for account in accounts.accounts]
                 is_valid = account_id in account_ids
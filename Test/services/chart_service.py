@@ -1,4 +1,8 @@
 import logging
+import concurrent.futures
+import multiprocessing
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import pandas as pd
@@ -13,21 +17,184 @@ import asyncio
 
 logger = logging.getLogger(__name__)
 
+# Смещение начала периода по его имени (см. operation_service)
+_PERIOD_DELTAS = {
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+    'month': timedelta(days=30),
+    'year': timedelta(days=365),
+    'all_time': timedelta(days=365*10)
+}
+
+_DEFAULT_PERIOD_DELTA = timedelta(days=7)
+
+# Пул процессов для отрисовки: matplotlib - CPU-bound и держит
+# глобальное состояние pyplot, поэтому рендерим вне цикла событий
+# и вне потоков
+_chart_pool = None
+
+
+def _get_chart_pool():
+    global _chart_pool
+    if _chart_pool is None:
+        # spawn вместо fork: пул создается лениво, когда процесс уже
+        # многопоточный (цикл событий, gRPC, поток логирования), а fork
+        # копирует чужие блокировки в захваченном состоянии
+        _chart_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _chart_pool
+
+
+def _get_period_name(period: str) -> str:
+    """Получение названия периода на русском"""
+    period_names = {
+        'day': 'день',
+        'week': 'неделю',
+        'month': 'месяц',
+        'year': 'год',
+        'all_time': 'все время'
+    }
+    return period_names.get(period, 'период')
+
+
+def _render_capital_png(daily_data: List[Dict], period: str) -> bytes:
+    """Отрисовка графика капитала в PNG (выполняется в пуле процессов)"""
+    try:
+        plt.style.use('dark_background')
+        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
+
+        dates = [data['date'] for data in daily_data]
+        capital = [data['capital'] for data in daily_data]
+        daily_income = [data['daily_income'] for data in daily_data]
+
+        ax1.plot(dates, capital, 'o-', color='#00FFAA', linewidth=2, markersize=6, label='Капитал')
+        ax1.fill_between(dates, capital, alpha=0.3, color='#00FFAA')
+        ax1.set_title(f'📈 Изменение капитала за {_get_period_name(period)}',
+                     fontsize=14, fontweight='bold', pad=20)
+        ax1.set_ylabel('Капитал, ₽', fontsize=12)
+        ax1.grid(True, alpha=0.3)
+        ax1.legend()
+
+        ax1.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x:,.0f}₽'))
+        ax1.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
+
+        colors = ['#00FFAA' if x >= 0 else '#FF4444' for x in daily_income]
+        bars = ax2.bar(dates, daily_income, color=colors, alpha=0.7, label='Доход/расход')
+        ax2.set_title('💸 Ежедневный доход/расход', fontsize=12, fontweight='bold', pad=20)
+        ax2.set_ylabel('Сумма, ₽', fontsize=12)
+        ax2.set_xlabel('Дата', fontsize=12)
+        ax2.grid(True, alpha=0.3)
+
+        for bar in bars:
+            height = bar.get_height()
+            if height != 0:
+                ax2.text(bar.get_x() + bar.get_width()/2., height,
+                        f'{height:+.0f}₽',
+                        ha='center', va='bottom' if height > 0 else 'top',
+                        fontsize=9, fontweight='bold')
+
+        plt.tight_layout()
+
+        buf = io.BytesIO()
+        plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
+        return buf.getvalue()
+    finally:
+        plt.close()
+
+
+def _render_income_png(daily_income_data: List[Dict], period: str) -> bytes:
+    """Отрисовка графика доходности в PNG (выполняется в пуле процессов)"""
+    try:
+        plt.style.use('dark_background')
+        fig, ax = plt.subplots(figsize=(12, 6))
+
+        dates = [data['date'] for data in daily_income_data]
+        income = [data['income'] for data in daily_income_data]
+
+        cumulative_income = np.cumsum(income)
+
+        ax.plot(dates, cumulative_income, 'o-', color='#00AAFF', linewidth=3,
+               label='Накопительный доход', markersize=6)
+        ax.fill_between(dates, cumulative_income, alpha=0.3, color='#00AAFF')
+
+        ax2 = ax.twinx()
+        colors = ['#00FFAA' if x >= 0 else '#FF4444' for x in income]
+        ax2.bar(dates, income, alpha=0.5, color=colors, label='Ежедневный доход')
+
+        ax.set_title(f'💰 Доходность за {_get_period_name(period)}',
+                    fontsize=14, fontweight='bold', pad=20)
+        ax.set_ylabel('Накопительный доход, ₽', fontsize=12)
+        ax2.set_ylabel('Ежедневный доход, ₽', fontsize=12)
+        ax.set_xlabel('Дата', fontsize=12)
+
+        ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x:,.0f}₽'))
+        ax2.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x:,.0f}₽'))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
+
+        ax.grid(True, alpha=0.3)
+        ax.legend(loc='upper left')
+        ax2.legend(loc='upper right')
+
+        plt.tight_layout()
+
+        buf = io.BytesIO()
+        plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
+        return buf.getvalue()
+    finally:
+        plt.close()
+
+
 class ChartService:
-    def __init__(self, token: str):
+    def __init__(self, token: str, client_provider=None):
         self.token = token
+        # Поставщик общего gRPC-клиента; без него соединение на вызов
+        self._client_provider = client_provider
 
-    async def generate_capital_chart(self, account_ids: List[str], period: str) -> io.BytesIO:
-        """Генерация графика изменения капитала за период для нескольких счетов"""
+    def _connect(self):
+        if self._client_provider is not None:
+            return self._client_provider()
+        return AsyncClient(self.token)
+
+    async def get_capital_series(self, account_ids: List[str], period: str) -> List[Dict]:
+        """Ряд капитала по дням без отрисовки (для ETag и прочих проверок)"""
         try:
             operations = await self._get_operations_for_accounts_period(account_ids, period)
             if not operations:
-                return None
+                return []
+            return await self._calculate_daily_capital(operations, period)
+        except Exception as e:
+            logger.error(f"Error getting capital series: {e}")
+            return []
 
-            daily_data = await self._calculate_daily_capital(operations, period)
-            
+    async def get_income_series(self, account_ids: List[str], period: str) -> List[Dict]:
+        """Ряд доходности по дням без отрисовки (для ETag и прочих проверок)"""
+        try:
+            operations = await self._get_operations_for_accounts_period(account_ids, period)
+            if not operations:
+                return []
+            return await self._calculate_daily_income(operations, period)
+        except Exception as e:
+            logger.error(f"Error getting income series: {e}")
+            return []
+
+    async def render_capital_chart(self, daily_data: List[Dict], period: str) -> io.BytesIO:
+        """Отрисовка графика капитала по готовому ряду"""
+        return await self._create_capital_chart(daily_data, period)
+
+    async def render_income_chart(self, daily_income: List[Dict], period: str) -> io.BytesIO:
+        """Отрисовка графика доходности по готовому ряду"""
+        return await self._create_income_chart(daily_income, period)
+
+    async def generate_capital_chart(self, account_ids: List[str], period: str) -> io.BytesIO:
+        """Генерация графика изменения капитала за период для нескольких счетов"""
+        try:
+            daily_data = await self.get_capital_series(account_ids, period)
+            if not daily_data:
+                return None
             return await self._create_capital_chart(daily_data, period)
-            
+
         except Exception as e:
             logger.error(f"Error generating capital chart: {e}")
             return None
@@ -35,14 +202,11 @@ class ChartService:
     async def generate_income_chart(self, account_ids: List[str], period: str) -> io.BytesIO:
         """Генерация графика доходности по дням для нескольких счетов"""
         try:
-            operations = await self._get_operations_for_accounts_period(account_ids, period)
-            if not operations:
+            daily_income = await self.get_income_series(account_ids, period)
+            if not daily_income:
                 return None
-
-            daily_income = await self._calculate_daily_income(operations, period)
-            
             return await self._create_income_chart(daily_income, period)
-            
+
         except Exception as e:
             logger.error(f"Error generating income chart: {e}")
             return None
@@ -74,21 +238,9 @@ class ChartService:
     async def _get_operations_for_period(self, account_id: str, period: str) -> List:
         """Получение операций за указанный период для одного счета"""
         try:
-            async with AsyncClient(self.token) as client:
+            async with self._connect() as client:
                 end_date = datetime.now()
-                
-                if period == 'day':
-                    start_date = end_date - timedelta(days=1)
-                elif period == 'week':
-                    start_date = end_date - timedelta(weeks=1)
-                elif period == 'month':
-                    start_date = end_date - timedelta(days=30)
-                elif period == 'year':
-                    start_date = end_date - timedelta(days=365)
-                elif period == 'all_time':
-                    start_date = end_date - timedelta(days=365*10)
-                else:
-                    start_date = end_date - timedelta(days=7)
+                start_date = end_date - _PERIOD_DELTAS.get(period, _DEFAULT_PERIOD_DELTA)
 
                 operations = await client.operations.get_operations(
                     account_id=account_id,
@@ -180,51 +332,14 @@ class ChartService:
             if not daily_data:
                 return None
 
-            plt.style.use('dark_background')
-            fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
-            
-            dates = [data['date'] for data in daily_data]
-            capital = [data['capital'] for data in daily_data]
-            daily_income = [data['daily_income'] for data in daily_data]
-            
-            ax1.plot(dates, capital, 'o-', color='#00FFAA', linewidth=2, markersize=6, label='Капитал')
-            ax1.fill_between(dates, capital, alpha=0.3, color='#00FFAA')
-            ax1.set_title(f'📈 Изменение капитала за {self._get_period_name(period)}', 
-                         fontsize=14, fontweight='bold', pad=20)
-            ax1.set_ylabel('Капитал, ₽', fontsize=12)
-            ax1.grid(True, alpha=0.3)
-            ax1.legend()
-            
-            ax1.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x:,.0f}₽'))
-            ax1.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
-            
-            colors = ['#00FFAA' if x >= 0 else '#FF4444' for x in daily_income]
-            bars = ax2.bar(dates, daily_income, color=colors, alpha=0.7, label='Доход/расход')
-            ax2.set_title('💸 Ежедневный доход/расход', fontsize=12, fontweight='bold', pad=20)
-            ax2.set_ylabel('Сумма, ₽', fontsize=12)
-            ax2.set_xlabel('Дата', fontsize=12)
-            ax2.grid(True, alpha=0.3)
-            
-            for bar in bars:
-                height = bar.get_height()
-                if height != 0:
-                    ax2.text(bar.get_x() + bar.get_width()/2., height,
-                            f'{height:+.0f}₽',
-                            ha='center', va='bottom' if height > 0 else 'top', 
-                            fontsize=9, fontweight='bold')
-            
-            plt.tight_layout()
-            
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-            buf.seek(0)
-            plt.close()
-            
-            return buf
-            
+            loop = asyncio.get_running_loop()
+            png = await loop.run_in_executor(
+                _get_chart_pool(), _render_capital_png, daily_data, period
+            )
+            return io.BytesIO(png)
+
         except Exception as e:
             logger.error(f"Error creating capital chart: {e}")
-            plt.close()
             return None
 
     async def _create_income_chart(self, daily_income: List[Dict], period: str) -> io.BytesIO:
@@ -233,60 +348,19 @@ class ChartService:
             if not daily_income:
                 return None
 
-            plt.style.use('dark_background')
-            fig, ax = plt.subplots(figsize=(12, 6))
-            
-            dates = [data['date'] for data in daily_income]
-            income = [data['income'] for data in daily_income]
-            
-            cumulative_income = np.cumsum(income)
-            
-            ax.plot(dates, cumulative_income, 'o-', color='#00AAFF', linewidth=3, 
-                   label='Накопительный доход', markersize=6)
-            ax.fill_between(dates, cumulative_income, alpha=0.3, color='#00AAFF')
-            
-            ax2 = ax.twinx()
-            colors = ['#00FFAA' if x >= 0 else '#FF4444' for x in income]
-            bars = ax2.bar(dates, income, alpha=0.5, color=colors, label='Ежедневный доход')
-            
-            ax.set_title(f'💰 Доходность за {self._get_period_name(period)}', 
-                        fontsize=14, fontweight='bold', pad=20)
-            ax.set_ylabel('Накопительный доход, ₽', fontsize=12)
-            ax2.set_ylabel('Ежедневный доход, ₽', fontsize=12)
-            ax.set_xlabel('Дата', fontsize=12)
-            
-            ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x:,.0f}₽'))
-            ax2.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f'{x:,.0f}₽'))
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
-            
-            ax.grid(True, alpha=0.3)
-            ax.legend(loc='upper left')
-            ax2.legend(loc='upper right')
-            
-            plt.tight_layout()
-            
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-            buf.seek(0)
-            plt.close()
-            
-            return buf
-            
+            loop = asyncio.get_running_loop()
+            png = await loop.run_in_executor(
+                _get_chart_pool(), _render_income_png, daily_income, period
+            )
+            return io.BytesIO(png)
+
         except Exception as e:
             logger.error(f"Error creating income chart: {e}")
-            plt.close()
             return None
 
     def _get_period_name(self, period: str) -> str:
         """Получение названия периода на русском"""
-        period_names = {
-            'day': 'день',
-            'week': 'неделю', 
-            'month': 'месяц',
-            'year': 'год',
-            'all_time': 'все время'
-        }
-        return period_names.get(period, 'период')
+        return _get_period_name(period)
 
     def _operation_to_decimal(self, operation) -> Decimal:
         """Конвертация операции в decimal"""
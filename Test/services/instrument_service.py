@@ -1,22 +1,36 @@
 import logging
+from typing import Dict
 from tinkoff.invest import AsyncClient, InstrumentIdType
 
 logger = logging.getLogger(__name__)
 
 class InstrumentService:
-    def __init__(self, token: str):
+    def __init__(self, token: str, client_provider=None):
         self.token = token
+        # Названия инструментов не меняются - кэшируем их по FIGI навсегда
+        self._name_cache: Dict[str, str] = {}
+        # Поставщик общего gRPC-клиента; без него соединение на вызов
+        self._client_provider = client_provider
+
+    def _connect(self):
+        if self._client_provider is not None:
+            return self._client_provider()
+        return AsyncClient(self.token)
 
     async def get_instrument_name(self, figi: str) -> str:
         """Получение названия инструмента по FIGI"""
+        cached = self._name_cache.get(figi)
+        if cached is not None:
+            return cached
         try:
-            async with AsyncClient(self.token) as client:
+            async with self._connect() as client:
                 instrument = await client.instruments.get_instrument_by(
-                    id_type=InstrumentIdType.INSTRUMENT_ID_TYPE_FIGI, 
+                    id_type=InstrumentIdType.INSTRUMENT_ID_TYPE_FIGI,
                     id=figi
                 )
-                return instrument.instrument.name
+                name = instrument.instrument.name
+                self._name_cache[figi] = name
+                return name
         except Exception as e:
             logger.error(f"Error getting instrument name for FIGI {figi}: {e}")
             return "Неизвестный инструмент"
-        
\ No newline at end of file
@@ -8,14 +8,60 @@ import asyncio
 
 logger = logging.getLogger(__name__)
 
+# Смещение начала периода по его имени: поиск в dict вместо
+# цепочки строковых сравнений на каждый запрос
+_PERIOD_DELTAS = {
+    'day': timedelta(days=1),
+    'week': timedelta(weeks=1),
+    'month': timedelta(days=30),
+    'year': timedelta(days=365),
+    'all_time': timedelta(days=365*10)
+}
+
+_DEFAULT_PERIOD_DELTA = timedelta(days=7)
+
+# Emoji и описания по имени типа операции: один поиск в dict на строку
+_OPERATION_EMOJIS = {
+    "OPERATION_TYPE_BUY": "🟢",
+    "OPERATION_TYPE_SELL": "🔴",
+    "OPERATION_TYPE_COUPON": "💰",
+    "OPERATION_TYPE_DIVIDEND": "💵",
+    "OPERATION_TYPE_BROKER_COMMISSION": "💸",
+    "OPERATION_TYPE_SERVICE_COMMISSION": "⚖️",
+    "OPERATION_TYPE_TAX": "🏛️",
+    "OPERATION_TYPE_TAX_DIVIDEND": "🏛️",
+    "OPERATION_TYPE_TAX_COUPON": "🏛️"
+}
+
+_OPERATION_DESCRIPTIONS = {
+    "OPERATION_TYPE_BUY": "Покупка",
+    "OPERATION_TYPE_SELL": "Продажа",
+    "OPERATION_TYPE_COUPON": "Выплата купона",
+    "OPERATION_TYPE_DIVIDEND": "Выплата дивидендов",
+    "OPERATION_TYPE_BROKER_COMMISSION": "Комиссия брокера",
+    "OPERATION_TYPE_SERVICE_COMMISSION": "Комиссия за обслуживание",
+    "OPERATION_TYPE_TAX": "Удержание налога",
+    "OPERATION_TYPE_TAX_DIVIDEND": "Налог с дивидендов",
+    "OPERATION_TYPE_TAX_COUPON": "Налог с купонов",
+    "OPERATION_TYPE_INPUT": "Пополнение счета",
+    "OPERATION_TYPE_OUTPUT": "Вывод средств"
+}
+
 class OperationService:
-    def __init__(self, token: str):
+    def __init__(self, token: str, client_provider=None):
         self.token = token
+        # Поставщик общего gRPC-клиента; без него соединение на вызов
+        self._client_provider = client_provider
+
+    def _connect(self):
+        if self._client_provider is not None:
+            return self._client_provider()
+        return AsyncClient(self.token)
 
     async def get_operations(self, account_id: str, from_date: datetime, to_date: datetime) -> List[Operation]:
         """Получение операций за указанный период для одного счета"""
         try:
-            async with AsyncClient(self.token) as client:
+            async with self._connect() as client:
                 operations = await client.operations.get_operations(
                     account_id=account_id,
                     from_=from_date,
@@ -50,6 +96,38 @@ class OperationService:
             logger.error(f"Error getting operations for multiple accounts: {e}")
             return []
 
+    def get_operation_description(self, operation: Operation) -> str:
+        """Человекочитаемое описание типа операции"""
+        type_name = getattr(operation.operation_type, 'name', str(operation.operation_type))
+        return _OPERATION_DESCRIPTIONS.get(type_name, type_name)
+
+    async def render_batch(self, operations: List[Operation], instrument_service) -> List[Dict]:
+        """Подготовить операции к отображению одним проходом.
+
+        Сумма, описание, emoji и название инструмента собираются за один
+        обход списка; уникальные FIGI разрешаются одним параллельным
+        пакетом, а не по одному на строку.
+        """
+        figis = list({op.figi for op in operations if getattr(op, 'figi', None)})
+        instrument_names = {}
+        if figis:
+            resolved = await asyncio.gather(
+                *[instrument_service.get_instrument_name(figi) for figi in figis]
+            )
+            instrument_names = dict(zip(figis, resolved))
+
+        rendered = []
+        for operation in operations:
+            type_name = getattr(operation.operation_type, 'name', str(operation.operation_type))
+            rendered.append({
+                'date': operation.date,
+                'amount': float(self._operation_to_decimal(operation)),
+                'description': _OPERATION_DESCRIPTIONS.get(type_name, type_name),
+                'emoji': _OPERATION_EMOJIS.get(type_name, "📄"),
+                'instrument_name': instrument_names.get(getattr(operation, 'figi', None))
+            })
+        return rendered
+
     def _operation_to_decimal(self, operation: Operation) -> Decimal:
         """Конвертация операции в decimal"""
         try:
@@ -64,19 +142,7 @@ class OperationService:
         """Расчет дохода за указанный период для нескольких счетов"""
         try:
             end_date = datetime.now()
-            
-            if period == 'day':
-                start_date = end_date - timedelta(days=1)
-            elif period == 'week':
-                start_date = end_date - timedelta(weeks=1)
-            elif period == 'month':
-                start_date = end_date - timedelta(days=30)
-            elif period == 'year':
-                start_date = end_date - timedelta(days=365)
-            elif period == 'all_time':
-                start_date = end_date - timedelta(days=365*10)
-            else:
-                start_date = end_date - timedelta(days=7)
+            start_date = end_date - _PERIOD_DELTAS.get(period, _DEFAULT_PERIOD_DELTA)
 
             operations = await self.get_operations_for_accounts(account_ids, start_date, end_date)
             
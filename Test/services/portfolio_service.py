@@ -7,13 +7,20 @@ from tinkoff.invest.utils import quotation_to_decimal
 logger = logging.getLogger(__name__)
 
 class PortfolioService:
-    def __init__(self, token: str):
+    def __init__(self, token: str, client_provider=None):
         self.token = token
+        # Поставщик общего gRPC-клиента; без него соединение на вызов
+        self._client_provider = client_provider
+
+    def _connect(self):
+        if self._client_provider is not None:
+            return self._client_provider()
+        return AsyncClient(self.token)
 
     async def get_portfolio_positions(self, account_id: str) -> List[PortfolioPosition]:
         """Получение позиций портфеля"""
         try:
-            async with AsyncClient(self.token) as client:
+            async with self._connect() as client:
                 portfolio = await client.operations.get_portfolio(account_id=account_id)
                 return portfolio.positions
         except Exception as e:
@@ -42,7 +49,12 @@ class PortfolioService:
                     total_portfolio_value += position_value
                     
                     instrument_name = await instrument_service.get_instrument_name(position.figi)
-                    
+
+                    # Нижний регистр считаем один раз при загрузке:
+                    # рендер страниц потом читает готовые _name_lc/_type_lc
+                    instrument_type = str(position.instrument_type).lower()
+                    name_lower = instrument_name.lower()
+
                     position_info = {
                         'name': instrument_name,
                         'figi': position.figi,
@@ -50,17 +62,18 @@ class PortfolioService:
                         'current_price': float(current_price),
                         'value': float(position_value),
                         'yield': float(expected_yield),
-                        'type': position.instrument_type
+                        'type': position.instrument_type,
+                        '_name_lc': name_lower,
+                        '_type_lc': instrument_type
                     }
-                    
+
                     positions_info.append(position_info)
-                    
-                    instrument_type = str(position.instrument_type).lower()
-                    if 'share' in instrument_type or 'акция' in instrument_name.lower():
+
+                    if 'share' in instrument_type or 'акция' in name_lower:
                         stocks.append(position_info)
-                    elif 'bond' in instrument_type or 'облигация' in instrument_name.lower():
+                    elif 'bond' in instrument_type or 'облигация' in name_lower:
                         bonds.append(position_info)
-                    elif 'etf' in instrument_type or 'фонд' in instrument_name.lower():
+                    elif 'etf' in instrument_type or 'фонд' in name_lower:
                         etfs.append(position_info)
                     elif 'currency' in instrument_type:
                         currencies.append(position_info)
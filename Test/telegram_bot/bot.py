@@ -1,7 +1,7 @@
 import os
 import asyncio
+import hashlib
 import logging
-import re
 from typing import Dict, Optional
 
 from telegram import Update
@@ -16,6 +16,10 @@ from .handlers import CommandHandlers, CallbackHandlers, MessageHandlers
 
 logger = logging.getLogger(__name__)
 
+# Таблица экранирования Markdown: один проход str.translate на C-уровне
+# вместо regex-подстановки на каждое название инструмента
+_MD_TRANS = str.maketrans({c: '\\' + c for c in '\\_*[]()~`>#+-=|{}.!'})
+
 class TelegramBotHandler:
     def __init__(self):
         self.token = Config.TELEGRAM_BOT_TOKEN
@@ -23,17 +27,38 @@ class TelegramBotHandler:
         
         # Кэш для клиентов Tinkoff (user_id -> TinkoffInvestmentsClient)
         self.tinkoff_clients: Dict[int, TinkoffInvestmentsClient] = {}
+        # Клиенты по хэшу токена: несколько user_id с одним токеном
+        # делят один клиент и его внутренние кэши
+        self._clients_by_token: Dict[str, TinkoffInvestmentsClient] = {}
         self.user_pagination_data = {}
+        # Сессионный кэш уже отсортированных списков для пагинации
+        self.session_cache: Dict[tuple, tuple] = {}
         
-        # Используем более консервативные таймауты
+        # Большой общий пул соединений: повторные вызовы Telegram API
+        # переиспользуют уже открытые TLS-соединения вместо новых рукопожатий
         request = HTTPXRequest(
-            connect_timeout=30.0,
+            connection_pool_size=64,
+            connect_timeout=5.0,
+            read_timeout=20.0,
+            write_timeout=20.0,
+            pool_timeout=5.0,
+            http_version="2"
+        )
+        # Отдельный пул для long polling, чтобы getUpdates не занимал общий
+        get_updates_request = HTTPXRequest(
+            connection_pool_size=8,
+            connect_timeout=5.0,
             read_timeout=30.0,
-            write_timeout=30.0,
-            pool_timeout=30.0
+            http_version="2"
+        )
+
+        self.application = (
+            Application.builder()
+            .token(self.token)
+            .request(request)
+            .get_updates_request(get_updates_request)
+            .build()
         )
-        
-        self.application = Application.builder().token(self.token).request(request).build()
         
         # Инициализируем обработчики
         self.command_handlers = CommandHandlers(self)
@@ -62,19 +87,44 @@ class TelegramBotHandler:
         """Настройка обработчика ошибок"""
         self.application.add_error_handler(self.error_handler)
 
+    @staticmethod
+    def _token_key(api_token: str) -> str:
+        """Ключ кэша клиентов: токен в кэше в открытом виде не храним"""
+        return hashlib.blake2b(api_token.encode(), digest_size=16).hexdigest()
+
     async def get_tinkoff_client(self, user_id: int) -> Optional[TinkoffInvestmentsClient]:
         """Получить клиент Tinkoff для пользователя"""
         if user_id in self.tinkoff_clients:
             return self.tinkoff_clients[user_id]
-        
+
         api_token = await self.user_service.get_user_api_token(user_id)
         if not api_token:
             return None
-        
-        client = TinkoffInvestmentsClient(api_token)
+
+        # Клиент тянет за собой 5 сервисных объектов и их кэши,
+        # поэтому создаем его один раз на токен, а не на пользователя
+        token_key = self._token_key(api_token)
+        client = self._clients_by_token.get(token_key)
+        if client is None:
+            client = TinkoffInvestmentsClient(api_token)
+            self._clients_by_token[token_key] = client
         self.tinkoff_clients[user_id] = client
         return client
 
+    def drop_client(self, user_id: int):
+        """Сбросить кэшированный клиент пользователя (смена/удаление токена)"""
+        client = self.tinkoff_clients.pop(user_id, None)
+        if client is not None and client not in self.tinkoff_clients.values():
+            # Токен больше никем не используется - убираем и общий клиент
+            for token_key, shared in list(self._clients_by_token.items()):
+                if shared is client:
+                    del self._clients_by_token[token_key]
+                    try:
+                        asyncio.get_running_loop().create_task(client.aclose())
+                    except RuntimeError:
+                        pass
+                    break
+
     async def validate_user_token(self, user_id: int) -> bool:
         """Проверка валидности токена пользователя"""
         try:
@@ -91,9 +141,8 @@ class TelegramBotHandler:
         """Экранирование символов Markdown"""
         if not text:
             return text
-            
-        escape_chars = r'\_*[]()~`>#+-=|{}.!'
-        return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', text)
+
+        return text.translate(_MD_TRANS)
 
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик ошибок"""
@@ -205,8 +205,7 @@ class MessageHandlers:
             await self.bot.user_service.set_user_api_token(user_id, token)
             
             # Очищаем кэш клиента
-            if user_id in self.bot.tinkoff_clients:
-                del self.bot.tinkoff_clients[user_id]
+            self.bot.drop_client(user_id)
             
             await update.message.reply_text(
                 "✅ API токен успешно сохранен и проверен!\n\n"
@@ -247,6 +246,11 @@ class CallbackHandlers:
         callback_data = query.data
         user_id = query.from_user.id
 
+        # Любое нажатие кроме переключения счета делает отложенную
+        # перерисовку списка счетов неактуальной
+        if not callback_data.startswith("toggle_account_"):
+            self.menu_manager.cancel_pending(user_id)
+
         try:
             if callback_data.startswith("toggle_account_"):
                 await self._handle_account_toggle(query, callback_data, user_id)
@@ -319,9 +323,10 @@ class CallbackHandlers:
             await self.bot.user_service.remove_user_account(user_id, account_id)
         else:
             await self.bot.user_service.add_user_account(user_id, account_id)
-        
-        # Обновляем сообщение
-        await self.menu_manager.show_accounts_query(query)
+
+        # Обновляем сообщение с коалесцированием быстрых нажатий,
+        # чтобы не упираться во флуд-лимит Telegram на редактирование
+        await self.menu_manager.schedule_edit(user_id, query, self.menu_manager.show_accounts_query)
 
     async def _handle_save_accounts(self, query, user_id):
         """Обработка сохранения счетов"""
@@ -346,8 +351,7 @@ class CallbackHandlers:
     async def _handle_clear_data(self, query, user_id):
         """Обработка очистки данных"""
         await self.bot.user_service.clear_user_data(user_id)
-        if user_id in self.bot.tinkoff_clients:
-            del self.bot.tinkoff_clients[user_id]
+        self.bot.drop_client(user_id)
         if user_id in self.bot.user_pagination_data:
             del self.bot.user_pagination_data[user_id]
         
@@ -360,7 +364,6 @@ class CallbackHandlers:
     async def _handle_delete_token(self, query, user_id):
         """Обработка удаления токена"""
         await self.bot.user_service.clear_user_data(user_id)
-        if user_id in self.bot.tinkoff_clients:
-            del self.bot.tinkoff_clients[user_id]
+        self.bot.drop_client(user_id)
         await query.edit_message_text("✅ API токен и все данные удалены. Используйте /set_token для установки нового токена.")
         
\ No newline at end of file
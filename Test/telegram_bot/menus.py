@@ -1,13 +1,138 @@
+import html
 import logging
 import asyncio
+import functools
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.error import NetworkError, TimedOut
+from telegram.error import BadRequest, NetworkError, TimedOut
 
 logger = logging.getLogger(__name__)
 
-class MenuManager:
-    def __init__(self, bot):
-        self.bot = bot
+def handle_unexpected(fallback_text: str):
+    """Декоратор для действительно неожиданных ошибок в обработчиках меню.
+
+    Ожидаемые ошибки (сеть, таймауты, кривые данные) обрабатываются узкими
+    except внутри самих методов; все остальное ловится здесь один раз,
+    логируется и показывается пользователю общим сообщением.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, target, *args, **kwargs):
+            try:
+                return await func(self, target, *args, **kwargs)
+            except Exception as e:
+                logger.error("Unexpected error in %s: %s", func.__name__, e, exc_info=True)
+                try:
+                    # target - либо callback query, либо обычное сообщение
+                    if hasattr(target, 'edit_message_text'):
+                        await target.edit_message_text(fallback_text)
+                    else:
+                        await target.reply_text(fallback_text)
+                except Exception as send_error:
+                    logger.error("Failed to report error to user: %s", send_error)
+        return wrapper
+    return decorator
+
+# Шаблоны строк счета компилируются один раз при загрузке модуля,
+# динамические поля экранируются через html.escape (реализован на C)
+_ACCOUNT_TPL = (
+    "{emoji} <b>Счет {i}:</b>\n"
+    "🏷️ <b>Название:</b> {name}\n"
+    "📊 <b>Тип:</b> {type}\n"
+    "📈 <b>Стоимость:</b> {value:,.2f} ₽\n"
+    "🔐 <b>ID:</b> <code>{id}</code>\n"
+    "📌 <b>Статус:</b> {status}\n\n"
+)
+
+_ACCOUNT_TPL_SHORT = (
+    "{emoji} <b>Счет {i}:</b>\n"
+    "🏷️ <b>Название:</b> {name}\n"
+    "📈 <b>Стоимость:</b> {value:,.2f} ₽\n"
+    "📌 <b>Статус:</b> {status}\n\n"
+)
+
+class _FrozenMarkup(InlineKeyboardMarkup):
+    """InlineKeyboardMarkup с закэшированной сериализацией.
+
+    PTB v20+ сериализует исходящую клавиатуру через to_dict() на каждый
+    вызов API (to_json на пути отправки не используется); для статических
+    меню результат всегда одинаков, поэтому словарь собирается один раз
+    при создании.
+    """
+    __slots__ = ("_cached_dict",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Приватные атрибуты можно выставлять и на "замороженном" объекте PTB
+        self._cached_dict = super().to_dict()
+
+    def to_dict(self, recursive=True):
+        return self._cached_dict
+
+# Статические клавиатуры собираются один раз при загрузке модуля
+_BACK_TO_MAIN_MARKUP = _FrozenMarkup([
+    [InlineKeyboardButton("🔙 Назад", callback_data="main_menu")]
+])
+
+_MAIN_MENU_MARKUP = _FrozenMarkup([
+    [
+        InlineKeyboardButton("👤 Мой портфель", callback_data="portfolio"),
+        InlineKeyboardButton("💰 Доходность", callback_data="income_menu")
+    ],
+    [
+        InlineKeyboardButton("📊 Все позиции", callback_data="positions"),
+        InlineKeyboardButton("🎯 Доход от облигаций", callback_data="bond_income")
+    ],
+    [
+        InlineKeyboardButton("📋 История операций", callback_data="operations"),
+        InlineKeyboardButton("💸 Расходы", callback_data="expenses")
+    ],
+    [
+        InlineKeyboardButton("🚀 Общий рост", callback_data="total_growth"),
+        InlineKeyboardButton("🔄 Сменить счета", callback_data="change_account")
+    ],
+    [
+        InlineKeyboardButton("🔑 Управление API", callback_data="manage_token"),
+        InlineKeyboardButton("🔔 Тест уведомлений", callback_data="notifications_menu")
+    ],
+    [
+        InlineKeyboardButton("ℹ️ Помощь", callback_data="help")
+    ]
+])
+
+_HELP_TEXT = """
+📖 Помощь по боту инвестиций 📖
+
+<b>Основные функции:</b>
+• 👤 <b>Портфель</b> - общая стоимость и основные позиции
+• 📊 <b>Все позиции</b> - полный список с пагинацией
+• 💰 <b>Доходность</b> - анализ доходности за разные периоды с графиками
+• 🚀 <b>Общий рост</b> - доход за все время с графиками
+• 🎯 <b>Облигации</b> - доход от купонных выплат
+• 📋 <b>Операции</b> - история всех операций с деталями
+• 💸 <b>Расходы</b> - комиссии и прочие расходы
+
+<b>Новые возможности:</b>
+• 📈 <b>Графики капитала</b> - визуализация изменения стоимости портфеля
+• 📊 <b>Графики доходности</b> - наглядное представление доходов и расходов
+• 🚀 <b>Общий рост за все время</b> - полная история инвестиций
+• 🔑 <b>Безопасное хранение</b> - API ключи хранятся в зашифрованном виде
+• 📊 <b>Множественные счета</b> - работа с несколькими счетами одновременно
+
+💡 <b>Для начала работы просто выберите нужный пункт из меню!</b>
+"""
+
+_DELETE_TOKEN_CONFIRM_MARKUP = _FrozenMarkup([
+    [
+        InlineKeyboardButton("✅ Да, удалить", callback_data="delete_token"),
+        InlineKeyboardButton("❌ Нет, отмена", callback_data="manage_token")
+    ]
+])
+
+class SafeMessenger:
+    """Общая база для обработчиков: отправка и редактирование сообщений
+    с повторными попытками при сетевых сбоях."""
+
+    __slots__ = ()
 
     async def safe_edit_message(self, query, text: str, **kwargs):
         """Безопасное редактирование сообщения с повторными попытками"""
@@ -17,14 +142,14 @@ class MenuManager:
                 await query.edit_message_text(text, **kwargs)
                 return True
             except (NetworkError, TimedOut) as e:
-                logger.warning(f"Attempt {attempt + 1} failed: {e}")
+                logger.warning("Attempt %d failed: %s", attempt + 1, e)
                 if attempt < max_retries - 1:
                     await asyncio.sleep(2 ** attempt)
                 else:
-                    logger.error(f"Failed to edit message after {max_retries} attempts")
+                    logger.error("Failed to edit message after %d attempts", max_retries)
                     return False
             except Exception as e:
-                logger.error(f"Unexpected error while editing message: {e}")
+                logger.error("Unexpected error while editing message: %s", e)
                 return False
         return False
 
@@ -36,48 +161,88 @@ class MenuManager:
                 await message.reply_text(text, **kwargs)
                 return True
             except (NetworkError, TimedOut) as e:
-                logger.warning(f"Attempt {attempt + 1} failed: {e}")
+                logger.warning("Attempt %d failed: %s", attempt + 1, e)
                 if attempt < max_retries - 1:
                     await asyncio.sleep(2 ** attempt)
                 else:
-                    logger.error(f"Failed to send message after {max_retries} attempts")
+                    logger.error("Failed to send message after %d attempts", max_retries)
                     return False
             except Exception as e:
-                logger.error(f"Unexpected error while sending message: {e}")
+                logger.error("Unexpected error while sending message: %s", e)
                 return False
         return False
 
+class MenuManager(SafeMessenger):
+    __slots__ = ("bot", "_pending")
+
+    def __init__(self, bot):
+        self.bot = bot
+        # Отложенные перерисовки меню по пользователям (user_id -> Task)
+        self._pending = {}
+
+    async def schedule_edit(self, user_id: int, query, render_fn, delay: float = 0.3):
+        """Отложенная перерисовка с коалесцированием.
+
+        Telegram ограничивает редактирование сообщения примерно одним
+        запросом в секунду; при быстрых нажатиях (переключение нескольких
+        счетов подряд) отменяем еще не выполненную перерисовку и оставляем
+        только последнюю - пользователь увидит итоговое состояние.
+        """
+        pending = self._pending.get(user_id)
+        if pending and not pending.done():
+            pending.cancel()
+        self._pending[user_id] = asyncio.create_task(
+            self._debounced(user_id, query, render_fn, delay)
+        )
+
+    def cancel_pending(self, user_id: int):
+        """Отменить отложенную перерисовку, если она еще не выполнилась.
+
+        Вызывается на любом callback кроме переключения счета: иначе
+        запланированный показ списка счетов сработал бы после нового
+        экрана и перетер его.
+        """
+        pending = self._pending.pop(user_id, None)
+        if pending and not pending.done():
+            pending.cancel()
+
+    async def _debounced(self, user_id: int, query, render_fn, delay: float):
+        try:
+            await asyncio.sleep(delay)
+            await render_fn(query)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if self._pending.get(user_id) is asyncio.current_task():
+                self._pending.pop(user_id, None)
+
     async def show_token_setup(self, message):
         """Показать настройку токена"""
-        keyboard = [
-            [InlineKeyboardButton("🔙 Назад", callback_data="main_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         text = (
-            "🔑 *Настройка API токена Tinkoff*\n\n"
+            "🔑 <b>Настройка API токена Tinkoff</b>\n\n"
             "Для работы с ботом необходим API токен Tinkoff Invest.\n\n"
             "1. Получите токен в личном кабинете Tinkoff Invest\n"
             "2. Отправьте его мне сообщением\n\n"
-            "⚠️ *Внимание:* Токен хранится в зашифрованном виде и не передается третьим лицам.\n\n"
+            "⚠️ <b>Внимание:</b> Токен хранится в зашифрованном виде и не передается третьим лицам.\n\n"
             "Отправьте ваш API токен:"
         )
-        
-        await self.safe_send_message(message, text, reply_markup=reply_markup, parse_mode='Markdown')
 
+        await self.safe_send_message(message, text, reply_markup=_BACK_TO_MAIN_MARKUP, parse_mode='HTML')
+
+    @handle_unexpected("❌ Ошибка при получении списка счетов.")
     async def show_accounts(self, message):
         try:
             user_id = message.from_user.id
             client = await self.bot.get_tinkoff_client(user_id)
-            
+
             if not client:
                 await self.show_token_setup(message)
                 return
-            
+
             await self.safe_send_message(message, "⏳ Получаю список ваших счетов...")
-            
+
             accounts = await client.get_accounts()
-            
+
             if not accounts:
                 await self.safe_send_message(
                     message,
@@ -88,235 +253,176 @@ class MenuManager:
                     "• Доступ к интернету"
                 )
                 return
-            
+
             # Получаем текущие выбранные счета
             selected_accounts = await self.bot.user_service.get_user_accounts(user_id)
-            
-            text = "📋 *Ваши счета в Tinkoff:*\n\n"
+            # Проверка принадлежности к set - O(1) вместо O(n) по списку
+            selected_set = selected_accounts if isinstance(selected_accounts, (set, frozenset)) else set(selected_accounts)
+
+            # Тексты кнопок и callback_data собираем заранее одним проходом,
+            # чтобы не гонять f-строки внутри горячего цикла рендера
+            callback_ids = [f"toggle_account_{a['id']}" for a in accounts]
+            labels = [
+                f"❌ Убрать {a['name']}" if a['id'] in selected_set else f"✅ Добавить {a['name']}"
+                for a in accounts
+            ]
+
+            parts = ["📋 <b>Ваши счета в Tinkoff:</b>\n\n"]
             keyboard = []
-            
+
             for i, account in enumerate(accounts, 1):
                 emoji = client.get_account_emoji(account['name'])
-                is_selected = account['id'] in selected_accounts
+                is_selected = account['id'] in selected_set
                 status_emoji = "✅" if is_selected else "❌"
-                
-                account_name_escaped = self.bot.escape_markdown(account['name'])
-                account_type_escaped = self.bot.escape_markdown(account['type'])
-                account_id_escaped = self.bot.escape_markdown(account['id'])
-                
-                text += f"{emoji} *Счет {i}:*\n"
-                text += f"🏷️ *Название:* {account_name_escaped}\n"
-                text += f"📊 *Тип:* {account_type_escaped}\n"
-                text += f"📈 *Стоимость:* {account['portfolio_value']:,.2f} ₽\n"
-                text += f"🔐 *ID:* `{account_id_escaped}`\n"
-                text += f"📌 *Статус:* {status_emoji}\n\n"
-                
-                if is_selected:
-                    keyboard.append([InlineKeyboardButton(
-                        f"❌ Убрать {account['name']}",
-                        callback_data=f"toggle_account_{account['id']}"
-                    )])
-                else:
-                    keyboard.append([InlineKeyboardButton(
-                        f"✅ Добавить {account['name']}",
-                        callback_data=f"toggle_account_{account['id']}"
-                    )])
-            
+
+                parts.append(_ACCOUNT_TPL.format(
+                    emoji=emoji,
+                    i=i,
+                    name=html.escape(account['name']),
+                    type=html.escape(account['type']),
+                    value=account['portfolio_value'],
+                    id=html.escape(account['id']),
+                    status=status_emoji
+                ))
+
+                keyboard.append([InlineKeyboardButton(labels[i - 1], callback_data=callback_ids[i - 1])])
+
             keyboard.append([InlineKeyboardButton("💾 Сохранить выбор", callback_data="save_accounts")])
             keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="main_menu")])
-            
-            text += "👇 Выберите счета для работы (можно несколько):"
-            
+
+            parts.append("👇 Выберите счета для работы (можно несколько):")
+
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await self.safe_send_message(message, text, reply_markup=reply_markup, parse_mode='Markdown')
-            
-        except Exception as e:
-            logging.error(f"Error in show_accounts: {e}")
+            await self.safe_send_message(message, "".join(parts), reply_markup=reply_markup, parse_mode='HTML')
+
+        except (NetworkError, TimedOut, BadRequest, KeyError, ValueError) as e:
+            logger.error("Error in show_accounts: %s", e)
             await self.safe_send_message(message, "❌ Ошибка при получении списка счетов.")
 
+    @handle_unexpected("❌ Ошибка при получении списка счетов.")
     async def show_accounts_query(self, query):
         try:
             user_id = query.from_user.id
             client = await self.bot.get_tinkoff_client(user_id)
-            
+
             if not client:
                 await self.safe_edit_message(query, "❌ API токен не установлен. Используйте /set_token")
                 return
-            
+
             await self.safe_edit_message(query, "⏳ Получаю список ваших счетов...")
-            
+
             accounts = await client.get_accounts()
-            
+
             if not accounts:
                 await self.safe_edit_message(query, "❌ Не удалось получить список счетов.")
                 return
-            
+
             # Получаем текущие выбранные счета
             selected_accounts = await self.bot.user_service.get_user_accounts(user_id)
-            
-            text = "📋 *Ваши счета в Tinkoff:*\n\n"
+            # Проверка принадлежности к set - O(1) вместо O(n) по списку
+            selected_set = selected_accounts if isinstance(selected_accounts, (set, frozenset)) else set(selected_accounts)
+
+            # Тексты кнопок и callback_data собираем заранее одним проходом,
+            # чтобы не гонять f-строки внутри горячего цикла рендера
+            callback_ids = [f"toggle_account_{a['id']}" for a in accounts]
+            labels = [
+                f"❌ Убрать {a['name']}" if a['id'] in selected_set else f"✅ Добавить {a['name']}"
+                for a in accounts
+            ]
+
+            parts = ["📋 <b>Ваши счета в Tinkoff:</b>\n\n"]
             keyboard = []
-            
+
             for i, account in enumerate(accounts, 1):
                 emoji = client.get_account_emoji(account['name'])
-                is_selected = account['id'] in selected_accounts
+                is_selected = account['id'] in selected_set
                 status_emoji = "✅" if is_selected else "❌"
-                
-                account_name_escaped = self.bot.escape_markdown(account['name'])
-                
-                text += f"{emoji} *Счет {i}:*\n"
-                text += f"🏷️ *Название:* {account_name_escaped}\n"
-                text += f"📈 *Стоимость:* {account['portfolio_value']:,.2f} ₽\n"
-                text += f"📌 *Статус:* {status_emoji}\n\n"
-                
-                if is_selected:
-                    keyboard.append([InlineKeyboardButton(
-                        f"❌ Убрать {account['name']}",
-                        callback_data=f"toggle_account_{account['id']}"
-                    )])
-                else:
-                    keyboard.append([InlineKeyboardButton(
-                        f"✅ Добавить {account['name']}",
-                        callback_data=f"toggle_account_{account['id']}"
-                    )])
-            
+
+                parts.append(_ACCOUNT_TPL_SHORT.format(
+                    emoji=emoji,
+                    i=i,
+                    name=html.escape(account['name']),
+                    value=account['portfolio_value'],
+                    status=status_emoji
+                ))
+
+                keyboard.append([InlineKeyboardButton(labels[i - 1], callback_data=callback_ids[i - 1])])
+
             keyboard.append([InlineKeyboardButton("💾 Сохранить выбор", callback_data="save_accounts")])
             keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="main_menu")])
-            
-            text += "👇 Выберите счета для работы (можно несколько):"
-            
+
+            parts.append("👇 Выберите счета для работы (можно несколько):")
+
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await self.safe_edit_message(query, text, reply_markup=reply_markup, parse_mode='Markdown')
-            
-        except Exception as e:
-            logging.error(f"Error in show_accounts_query: {e}")
+            await self.safe_edit_message(query, "".join(parts), reply_markup=reply_markup, parse_mode='HTML')
+
+        except (NetworkError, TimedOut, BadRequest, KeyError, ValueError) as e:
+            logger.error("Error in show_accounts_query: %s", e)
             await self.safe_edit_message(query, "❌ Ошибка при получении списка счетов.")
 
     async def show_main_menu(self, message):
         user_id = message.from_user.id
         selected_accounts = await self.bot.user_service.get_user_accounts(user_id)
         accounts_count = len(selected_accounts)
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("👤 Мой портфель", callback_data="portfolio"),
-                InlineKeyboardButton("💰 Доходность", callback_data="income_menu")
-            ],
-            [
-                InlineKeyboardButton("📊 Все позиции", callback_data="positions"),
-                InlineKeyboardButton("🎯 Доход от облигаций", callback_data="bond_income")
-            ],
-            [
-                InlineKeyboardButton("📋 История операций", callback_data="operations"),
-                InlineKeyboardButton("💸 Расходы", callback_data="expenses")
-            ],
-            [
-                InlineKeyboardButton("🚀 Общий рост", callback_data="total_growth"),
-                InlineKeyboardButton("🔄 Сменить счета", callback_data="change_account")
-            ],
-            [
-                InlineKeyboardButton("🔑 Управление API", callback_data="manage_token"),
-                InlineKeyboardButton("🔔 Тест уведомлений", callback_data="notifications_menu")
-            ],
-            [
-                InlineKeyboardButton("ℹ️ Помощь", callback_data="help")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        text = f"🏠 *Главное меню* 🏠\n\n"
+
+        text = f"🏠 <b>Главное меню</b> 🏠\n\n"
         text += f"📊 Выбрано счетов: {accounts_count}\n"
         text += f"Выберите действие:"
-        
+
         await self.safe_send_message(
             message,
             text,
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
+            reply_markup=_MAIN_MENU_MARKUP,
+            parse_mode='HTML'
         )
 
     async def show_main_menu_query(self, query):
         user_id = query.from_user.id
         selected_accounts = await self.bot.user_service.get_user_accounts(user_id)
         accounts_count = len(selected_accounts)
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("👤 Мой портфель", callback_data="portfolio"),
-                InlineKeyboardButton("💰 Доходность", callback_data="income_menu")
-            ],
-            [
-                InlineKeyboardButton("📊 Все позиции", callback_data="positions"),
-                InlineKeyboardButton("🎯 Доход от облигаций", callback_data="bond_income")
-            ],
-            [
-                InlineKeyboardButton("📋 История операций", callback_data="operations"),
-                InlineKeyboardButton("💸 Расходы", callback_data="expenses")
-            ],
-            [
-                InlineKeyboardButton("🚀 Общий рост", callback_data="total_growth"),
-                InlineKeyboardButton("🔄 Сменить счета", callback_data="change_account")
-            ],
-            [
-                InlineKeyboardButton("🔑 Управление API", callback_data="manage_token"),
-                InlineKeyboardButton("🔔 Тест уведомлений", callback_data="notifications_menu")
-            ],
-            [
-                InlineKeyboardButton("ℹ️ Помощь", callback_data="help")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        text = f"🏠 *Главное меню* 🏠\n\n"
+
+        text = f"🏠 <b>Главное меню</b> 🏠\n\n"
         text += f"📊 Выбрано счетов: {accounts_count}\n"
         text += f"Выберите действие:"
-        
+
         await self.safe_edit_message(
             query,
             text,
-            reply_markup=reply_markup,
-            parse_mode='Markdown'
+            reply_markup=_MAIN_MENU_MARKUP,
+            parse_mode='HTML'
         )
 
     async def show_token_management(self, query):
         """Показать меню управления API токеном"""
         user_id = query.from_user.id
         has_token = await self.bot.user_service.get_user_api_token(user_id) is not None
-        
+
         keyboard = []
-        
+
         if has_token:
             keyboard.append([InlineKeyboardButton("🗑️ Удалить API токен", callback_data="delete_token_confirm")])
         else:
             keyboard.append([InlineKeyboardButton("🔑 Установить API токен", callback_data="set_token")])
-        
+
         keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="main_menu")])
-        
+
         reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        text = "🔑 *Управление API токеном*\n\n"
-        
+
+        text = "🔑 <b>Управление API токеном</b>\n\n"
+
         if has_token:
             text += "✅ API токен установлен\n\n"
             text += "Вы можете удалить токен, если хотите использовать другой аккаунт или прекратить работу с ботом."
         else:
             text += "❌ API токен не установлен\n\n"
             text += "Для работы с ботом необходимо установить API токен Tinkoff Invest."
-        
-        await self.safe_edit_message(query, text, reply_markup=reply_markup, parse_mode='Markdown')
+
+        await self.safe_edit_message(query, text, reply_markup=reply_markup, parse_mode='HTML')
 
     async def show_delete_token_confirmation(self, query):
         """Показать подтверждение удаления токена"""
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ Да, удалить", callback_data="delete_token"),
-                InlineKeyboardButton("❌ Нет, отмена", callback_data="manage_token")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         text = (
-            "⚠️ *Подтверждение удаления API токена*\n\n"
+            "⚠️ <b>Подтверждение удаления API токена</b>\n\n"
             "Вы уверены, что хотите удалить ваш API токен?\n\n"
             "Это действие приведет к:\n"
             "• Удалению вашего API токена\n"
@@ -324,38 +430,10 @@ class MenuManager:
             "• Очистке всех персональных данных\n\n"
             "После удаления вы сможете установить новый токен."
         )
-        
-        await self.safe_edit_message(query, text, reply_markup=reply_markup, parse_mode='Markdown')
 
-    async def show_help(self, query):
-        try:
-            help_text = """
-📖 Помощь по боту инвестиций 📖
+        await self.safe_edit_message(query, text, reply_markup=_DELETE_TOKEN_CONFIRM_MARKUP, parse_mode='HTML')
 
-*Основные функции:*
-• 👤 *Портфель* - общая стоимость и основные позиции
-• 📊 *Все позиции* - полный список с пагинацией
-• 💰 *Доходность* - анализ доходности за разные периоды с графиками
-• 🚀 *Общий рост* - доход за все время с графиками
-• 🎯 *Облигации* - доход от купонных выплат
-• 📋 *Операции* - история всех операций с деталями
-• 💸 *Расходы* - комиссии и прочие расходы
-
-*Новые возможности:*
-• 📈 *Графики капитала* - визуализация изменения стоимости портфеля
-• 📊 *Графики доходности* - наглядное представление доходов и расходов
-• 🚀 *Общий рост за все время* - полная история инвестиций
-• 🔑 *Безопасное хранение* - API ключи хранятся в зашифрованном виде
-• 📊 *Множественные счета* - работа с несколькими счетами одновременно
-
-💡 *Для начала работы просто выберите нужный пункт из меню!*
-            """
-            
-            keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="main_menu")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await self.safe_edit_message(query, help_text, reply_markup=reply_markup, parse_mode='Markdown')
-        except Exception as e:
-            logging.error(f"Error in show_help: {e}")
-            await self.safe_edit_message(query, "❌ Ошибка при отображении справки.")
-            
\ No newline at end of file
+    async def show_help(self, query):
+        # Справка полностью статична: текст и клавиатура собраны при загрузке
+        # модуля, а все сетевые ошибки обрабатывает safe_edit_message
+        await self.safe_edit_message(query, _HELP_TEXT, reply_markup=_BACK_TO_MAIN_MARKUP, parse_mode='HTML')
@@ -1,26 +1,50 @@
 import logging
+import time
 from datetime import datetime, timedelta
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, NetworkError, TimedOut
+
+from .menus import SafeMessenger, handle_unexpected, _FrozenMarkup
 
 logger = logging.getLogger(__name__)
 
-class NotificationHandler:
+# Статические клавиатуры собираются один раз при загрузке модуля
+_NOTIFICATIONS_MENU_MARKUP = _FrozenMarkup([
+    [
+        InlineKeyboardButton("📊 Тест: Дневная сводка", callback_data="test_daily_summary"),
+        InlineKeyboardButton("📅 Тест: Предстоящие выплаты", callback_data="test_upcoming_payments")
+    ],
+    [
+        InlineKeyboardButton("🔙 Назад", callback_data="main_menu")
+    ]
+])
+
+_BACK_TO_NOTIFICATIONS_MARKUP = _FrozenMarkup([
+    [InlineKeyboardButton("🔙 Назад", callback_data="notifications_menu")]
+])
+
+# Время жизни закэшированных сводок, секунд
+_SUMMARY_CACHE_TTL = 60
+
+class NotificationHandler(SafeMessenger):
+    __slots__ = ("bot", "_summary_cache")
+
     def __init__(self, bot):
         self.bot = bot
+        # Кэш сводок и выплат: (вид, user_id, счета) -> (монотонное время, результат)
+        self._summary_cache = {}
+
+    def _get_cached(self, key):
+        cached = self._summary_cache.get(key)
+        if cached and time.monotonic() - cached[0] < _SUMMARY_CACHE_TTL:
+            return cached[1]
+        return None
+
+    def _put_cached(self, key, value):
+        self._summary_cache[key] = (time.monotonic(), value)
 
     async def show_notifications_menu(self, query):
         """Показать меню уведомлений для тестирования"""
-        keyboard = [
-            [
-                InlineKeyboardButton("📊 Тест: Дневная сводка", callback_data="test_daily_summary"),
-                InlineKeyboardButton("📅 Тест: Предстоящие выплаты", callback_data="test_upcoming_payments")
-            ],
-            [
-                InlineKeyboardButton("🔙 Назад", callback_data="main_menu")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         text = (
             "🔔 *Меню тестирования уведомлений*\n\n"
             "Здесь вы можете протестировать функционал уведомлений:\n\n"
@@ -31,8 +55,9 @@ class NotificationHandler:
             "• Уведомления о выплатах - по понедельникам в 13:00"
         )
         
-        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        await self.safe_edit_message(query, text, reply_markup=_NOTIFICATIONS_MENU_MARKUP, parse_mode='Markdown')
 
+    @handle_unexpected("❌ Ошибка при формировании сводки.")
     async def test_daily_summary(self, query):
         """Тестирование ежедневной сводки"""
         try:
@@ -40,28 +65,31 @@ class NotificationHandler:
             selected_accounts = await self.bot.user_service.get_user_accounts(user_id)
             
             if not selected_accounts:
-                await query.edit_message_text("❌ Счета не выбраны.")
+                await self.safe_edit_message(query, "❌ Счета не выбраны.")
                 return
 
             client = await self.bot.get_tinkoff_client(user_id)
             if not client:
-                await query.edit_message_text("❌ API токен не установлен.")
+                await self.safe_edit_message(query, "❌ API токен не установлен.")
                 return
 
-            await query.edit_message_text("⏳ Формирую дневную сводку...")
-            
-            daily_summary = await client.get_daily_summary(selected_accounts)
+            await self.safe_edit_message(query, "⏳ Формирую дневную сводку...")
+
+            # Повторные нажатия кнопки в течение минуты не гоняют Tinkoff API
+            cache_key = ('daily_summary', user_id, frozenset(selected_accounts))
+            daily_summary = self._get_cached(cache_key)
+            if daily_summary is None:
+                daily_summary = await client.get_daily_summary(selected_accounts)
+                self._put_cached(cache_key, daily_summary)
             message = await client.format_daily_summary_message(daily_summary)
+
+            await self.safe_edit_message(query, message, reply_markup=_BACK_TO_NOTIFICATIONS_MARKUP, parse_mode='Markdown')
             
-            keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="notifications_menu")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='Markdown')
-            
-        except Exception as e:
-            logging.error(f"Error in test_daily_summary: {e}")
-            await query.edit_message_text("❌ Ошибка при формировании сводки.")
+        except (NetworkError, TimedOut, BadRequest, KeyError, ValueError) as e:
+            logger.error("Error in test_daily_summary: %s", e)
+            await self.safe_edit_message(query, "❌ Ошибка при формировании сводки.")
 
+    @handle_unexpected("❌ Ошибка при проверке выплат.")
     async def test_upcoming_payments(self, query):
         """Тестирование уведомления о предстоящих выплатах"""
         try:
@@ -69,25 +97,27 @@ class NotificationHandler:
             selected_accounts = await self.bot.user_service.get_user_accounts(user_id)
             
             if not selected_accounts:
-                await query.edit_message_text("❌ Счета не выбраны.")
+                await self.safe_edit_message(query, "❌ Счета не выбраны.")
                 return
 
             client = await self.bot.get_tinkoff_client(user_id)
             if not client:
-                await query.edit_message_text("❌ API токен не установлен.")
+                await self.safe_edit_message(query, "❌ API токен не установлен.")
                 return
 
-            await query.edit_message_text("⏳ Проверяю предстоящие выплаты...")
-            
-            upcoming_payments = await client.get_upcoming_payments(selected_accounts)
+            await self.safe_edit_message(query, "⏳ Проверяю предстоящие выплаты...")
+
+            # Повторные нажатия кнопки в течение минуты не гоняют Tinkoff API
+            cache_key = ('upcoming_payments', user_id, frozenset(selected_accounts))
+            upcoming_payments = self._get_cached(cache_key)
+            if upcoming_payments is None:
+                upcoming_payments = await client.get_upcoming_payments(selected_accounts)
+                self._put_cached(cache_key, upcoming_payments)
             message = await client.format_upcoming_payments_message(upcoming_payments)
+
+            await self.safe_edit_message(query, message, reply_markup=_BACK_TO_NOTIFICATIONS_MARKUP, parse_mode='Markdown')
             
-            keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="notifications_menu")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(message, reply_markup=reply_markup, parse_mode='Markdown')
-            
-        except Exception as e:
-            logging.error(f"Error in test_upcoming_payments: {e}")
-            await query.edit_message_text("❌ Ошибка при проверке выплат.")
+        except (NetworkError, TimedOut, BadRequest, KeyError, ValueError) as e:
+            logger.error("Error in test_upcoming_payments: %s", e)
+            await self.safe_edit_message(query, "❌ Ошибка при проверке выплат.")
             
\ No newline at end of file
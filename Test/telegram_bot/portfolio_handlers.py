@@ -1,14 +1,89 @@
+import functools
 import logging
+import time
 from datetime import datetime, timedelta
+from heapq import nlargest
 from typing import List
+import numpy as np
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
 logger = logging.getLogger(__name__)
 
+
+@functools.lru_cache(maxsize=2048)
+def _build_nav_markup(prefix: str, page: int, total_pages: int) -> InlineKeyboardMarkup:
+    """Клавиатура пагинации, мемоизированная по (префикс, страница, всего).
+
+    Раскладка полностью определяется аргументами, поэтому одни и те же
+    объекты кнопок переиспользуются вместо пересоздания на каждый клик.
+    """
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"{prefix}_{page-1}"))
+
+    nav_buttons.append(InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data="no_action"))
+
+    if page < total_pages - 1:
+        nav_buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"{prefix}_{page+1}"))
+
+    return InlineKeyboardMarkup([
+        nav_buttons,
+        [InlineKeyboardButton("🔙 Назад в меню", callback_data="main_menu")]
+    ])
+
+# Время жизни сессионного кэша пагинации, секунд
+_SESSION_CACHE_TTL = 60
+
+# Предел сессионного кэша: ключи операций включают минутную корзину и
+# после смены минуты сами не перечитываются, поэтому без предела кэш
+# рос бы бесконечно
+_SESSION_CACHE_MAX = 256
+
+# Формат даты операции, вынесен из цикла рендера
+_DATE_FMT = "%d.%m.%Y %H:%M"
+
+# Emoji по типу позиции: сначала O(1) поиск по типу инструмента,
+# затем запасной проход по ключевым словам в названии
+_POSITION_TYPE_EMOJIS = {
+    "share": "📈",
+    "bond": "🎯",
+    "etf": "📊",
+    "currency": "💱"
+}
+
+_POSITION_NAME_EMOJIS = (
+    ("акция", "📈"),
+    ("облигация", "🎯"),
+    ("фонд", "📊"),
+    ("валюта", "💱")
+)
+
 class PortfolioHandler:
     def __init__(self, bot):
         self.bot = bot
 
+    def _session_get(self, key):
+        """Достать отсортированный список из сессионного кэша бота"""
+        cached = self.bot.session_cache.get(key)
+        if cached:
+            if time.monotonic() - cached[0] < _SESSION_CACHE_TTL:
+                return cached[1]
+            # Ленивая эвакуация протухших записей
+            del self.bot.session_cache[key]
+        return None
+
+    def _session_put(self, key, value):
+        cache = self.bot.session_cache
+        now = time.monotonic()
+        cache[key] = (now, value)
+        if len(cache) > _SESSION_CACHE_MAX:
+            # Сначала выметаем протухшее, затем при необходимости
+            # выбрасываем самые старые записи (порядок вставки dict)
+            for k in [k for k, v in cache.items() if now - v[0] >= _SESSION_CACHE_TTL]:
+                del cache[k]
+            while len(cache) > _SESSION_CACHE_MAX:
+                cache.pop(next(iter(cache)))
+
     async def show_portfolio(self, query):
         try:
             user_id = query.from_user.id
@@ -26,23 +101,40 @@ class PortfolioHandler:
             await query.edit_message_text("⏳ Загружаю данные портфеля...")
             portfolio_data = await client.get_portfolio_summary(selected_accounts)
             
-            portfolio_text = "📊 *Ваш инвестиционный портфель*\n\n"
-            portfolio_text += f"💰 *Общая стоимость:* {portfolio_data['total_value']:,.2f} ₽\n"
-            portfolio_text += f"📊 *Количество счетов:* {len(selected_accounts)}\n\n"
-            
-            top_positions = sorted(portfolio_data['positions'], key=lambda x: x['value'], reverse=True)[:5]
-            
+            # Сообщение собираем списком и склеиваем один раз в конце
+            parts = [
+                "📊 *Ваш инвестиционный портфель*\n\n",
+                f"💰 *Общая стоимость:* {portfolio_data['total_value']:,.2f} ₽\n",
+                f"📊 *Количество счетов:* {len(selected_accounts)}\n\n",
+            ]
+
+            if portfolio_data.get('partial'):
+                parts.append("⚠️ _Часть счетов не ответила вовремя, данные могут быть неполными_\n\n")
+
+            # Частичная выборка вместо полной сортировки: нужны только топ-5.
+            # При наличии массива стоимостей выбор делает numpy на C-уровне
+            positions = portfolio_data['positions']
+            values = portfolio_data.get('values')
+            if values is not None and len(values) > 5:
+                top_idx = np.argpartition(values, -5)[-5:]
+                top_idx = top_idx[np.argsort(-values[top_idx])]
+                top_positions = [positions[i] for i in top_idx]
+            else:
+                top_positions = nlargest(5, positions, key=lambda x: x['value'])
+
             for i, pos in enumerate(top_positions, 1):
                 emoji = self._get_position_emoji(pos)
                 pos_name_escaped = self.bot.escape_markdown(pos['name'])
-                portfolio_text += f"{i}. {emoji} *{pos_name_escaped}*\n"
-                portfolio_text += f"   💰 Стоимость: {pos['value']:,.2f} ₽\n"
-                portfolio_text += f"   📈 Доходность: {pos['yield']:,.2f} ₽\n\n"
-            
+                parts.append(f"{i}. {emoji} *{pos_name_escaped}*\n")
+                parts.append(f"   💰 Стоимость: {pos['value']:,.2f} ₽\n")
+                parts.append(f"   📈 Доходность: {pos['yield']:,.2f} ₽\n\n")
+
             if len(portfolio_data['positions']) > 5:
-                portfolio_text += f"📝 *Всего позиций:* {len(portfolio_data['positions'])}\n"
-                portfolio_text += "👉 Нажмите *\"Все позиции\"* чтобы увидеть полный список"
-                
+                parts.append(f"📝 *Всего позиций:* {len(portfolio_data['positions'])}\n")
+                parts.append("👉 Нажмите *\"Все позиции\"* чтобы увидеть полный список")
+
+            portfolio_text = "".join(parts)
+
             keyboard = [
                 [InlineKeyboardButton("📊 Все позиции", callback_data="positions_page_0")],
                 [InlineKeyboardButton("🔙 Назад", callback_data="main_menu")]
@@ -70,12 +162,22 @@ class PortfolioHandler:
                 return
 
             await query.edit_message_text("⏳ Загружаю детали по позициям...")
-            
-            portfolio_data = await client.get_portfolio_summary(selected_accounts)
-            
-            all_positions = portfolio_data['positions']
-            all_positions.sort(key=lambda x: x['value'], reverse=True)
-            
+
+            # Одна загрузка и сортировка обслуживает все страницы в пределах TTL
+            cache_key = ('positions', user_id, tuple(sorted(selected_accounts)))
+            all_positions = self._session_get(cache_key)
+            if all_positions is None:
+                portfolio_data = await client.get_portfolio_summary(selected_accounts)
+                all_positions = portfolio_data['positions']
+                values = portfolio_data.get('values')
+                if values is not None and len(values):
+                    # Сортировка индексов C-уровнем numpy вместо сравнения dict'ов
+                    order = np.argsort(-values, kind='stable')
+                    all_positions = [all_positions[i] for i in order]
+                else:
+                    all_positions = sorted(all_positions, key=lambda x: x['value'], reverse=True)
+                self._session_put(cache_key, all_positions)
+
             page_size = 10
             total_pages = (len(all_positions) + page_size - 1) // page_size
             
@@ -88,39 +190,28 @@ class PortfolioHandler:
             end_idx = min((page + 1) * page_size, len(all_positions))
             current_positions = all_positions[start_idx:end_idx]
             
-            positions_text = f"📊 *Все позиции ({page + 1}/{total_pages})*\n\n"
-            positions_text += f"*Всего позиций:* {len(all_positions)}\n"
-            positions_text += f"*Количество счетов:* {len(selected_accounts)}\n\n"
-            
+            # Сообщение собираем списком и склеиваем один раз в конце
+            parts = [
+                f"📊 *Все позиции ({page + 1}/{total_pages})*\n\n",
+                f"*Всего позиций:* {len(all_positions)}\n",
+                f"*Количество счетов:* {len(selected_accounts)}\n\n",
+            ]
+
             for i, pos in enumerate(current_positions, start=start_idx + 1):
                 emoji = self._get_position_emoji(pos)
                 pos_name_escaped = self.bot.escape_markdown(pos['name'])
-                
-                positions_text += f"{i}. {emoji} *{pos_name_escaped}*\n"
-                positions_text += f"   📊 *Тип:* {pos['type']}\n"
-                positions_text += f"   💰 *Стоимость:* {pos['value']:,.2f} ₽\n"
-                positions_text += f"   📦 *Количество:* {pos['quantity']} шт.\n"
-                positions_text += f"   💵 *Цена:* {pos['current_price']:,.2f} ₽\n"
-                positions_text += f"   📈 *Доходность:* {pos['yield']:,.2f} ₽\n\n"
-            
-            keyboard = []
-            
-            nav_buttons = []
-            if page > 0:
-                nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"positions_page_{page-1}"))
-            
-            nav_buttons.append(InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data="no_action"))
-            
-            if page < total_pages - 1:
-                nav_buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"positions_page_{page+1}"))
-            
-            if nav_buttons:
-                keyboard.append(nav_buttons)
-            
-            keyboard.append([InlineKeyboardButton("🔙 Назад в меню", callback_data="main_menu")])
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
+
+                parts.append(f"{i}. {emoji} *{pos_name_escaped}*\n")
+                parts.append(f"   📊 *Тип:* {pos['type']}\n")
+                parts.append(f"   💰 *Стоимость:* {pos['value']:,.2f} ₽\n")
+                parts.append(f"   📦 *Количество:* {pos['quantity']} шт.\n")
+                parts.append(f"   💵 *Цена:* {pos['current_price']:,.2f} ₽\n")
+                parts.append(f"   📈 *Доходность:* {pos['yield']:,.2f} ₽\n\n")
+
+            positions_text = "".join(parts)
+
+            reply_markup = _build_nav_markup("positions_page", page, total_pages)
+
             await query.edit_message_text(positions_text, reply_markup=reply_markup, parse_mode='Markdown')
             
         except Exception as e:
@@ -143,16 +234,24 @@ class PortfolioHandler:
 
             await query.edit_message_text("⏳ Загружаю историю операций...")
             
-            end_date = datetime.now()
+            # "Сейчас" округляем до минуты: соседние клики пагинации
+            # попадают в один и тот же ключ кэша и один сетевой запрос
+            bucket = int(time.time()) // 60
+            end_date = datetime.fromtimestamp(bucket * 60)
             start_date = end_date - timedelta(days=30)
-            operations = await client.get_operations(selected_accounts, start_date, end_date)
-            
+
+            # Одна загрузка и сортировка обслуживает все страницы в пределах TTL
+            cache_key = ('operations', user_id, tuple(sorted(selected_accounts)), bucket)
+            operations = self._session_get(cache_key)
+            if operations is None:
+                operations = await client.get_operations(selected_accounts, start_date, end_date)
+                operations.sort(key=lambda x: x.date, reverse=True)
+                self._session_put(cache_key, operations)
+
             if not operations:
                 await query.edit_message_text("📭 Операций за последние 30 дней не найдено.")
                 return
-            
-            operations.sort(key=lambda x: x.date, reverse=True)
-            
+
             page_size = 10
             total_pages = (len(operations) + page_size - 1) // page_size
             
@@ -165,94 +264,62 @@ class PortfolioHandler:
             end_idx = min((page + 1) * page_size, len(operations))
             current_operations = operations[start_idx:end_idx]
             
-            operations_text = f"📋 *История операций ({page + 1}/{total_pages})*\n\n"
-            operations_text += f"*Период:* последние 30 дней\n"
-            operations_text += f"*Всего операций:* {len(operations)}\n"
-            operations_text += f"*Количество счетов:* {len(selected_accounts)}\n\n"
-            
-            for i, operation in enumerate(current_operations, start=start_idx + 1):
-                date_str = operation.date.strftime("%d.%m.%Y %H:%M")
-                amount = float(client._operation_to_decimal(operation))
-                
-                operation_description = client.operation_service.get_operation_description(operation)
-                instrument_name = await client.operation_service.get_operation_instrument_name(
-                    operation, client.instrument_service
-                )
-                
-                operation_type_emoji = self._get_operation_type_emoji(operation.operation_type)
-                
-                operations_text += f"{i}. {operation_type_emoji} *{date_str}*\n"
-                operations_text += f"   *Операция:* {operation_description}\n"
-                
+            # Сумма, описание, emoji и названия инструментов для всей
+            # страницы готовятся одним проходом в сервисе операций
+            rendered = await client.operation_service.render_batch(
+                current_operations, client.instrument_service
+            )
+
+            # Сообщение собираем списком и склеиваем один раз в конце
+            parts = [
+                f"📋 *История операций ({page + 1}/{total_pages})*\n\n",
+                f"*Период:* последние 30 дней\n",
+                f"*Всего операций:* {len(operations)}\n",
+                f"*Количество счетов:* {len(selected_accounts)}\n\n",
+            ]
+
+            for i, row in enumerate(rendered, start=start_idx + 1):
+                date_str = row['date'].strftime(_DATE_FMT)
+                amount = row['amount']
+                instrument_name = row['instrument_name']
+
+                parts.append(f"{i}. {row['emoji']} *{date_str}*\n")
+                parts.append(f"   *Операция:* {row['description']}\n")
+
                 if instrument_name and instrument_name != "Неизвестный инструмент":
                     instrument_name_escaped = self.bot.escape_markdown(instrument_name)
-                    operations_text += f"   *Инструмент:* {instrument_name_escaped}\n"
-                
+                    parts.append(f"   *Инструмент:* {instrument_name_escaped}\n")
+
                 if amount != 0:
-                    amount_text = f"{amount:,.2f} ₽"
+                    # Текст суммы форматируем один раз на обе ветки
+                    amount_text = f"{abs(amount):,.2f} ₽"
                     if amount > 0:
-                        operations_text += f"   💰 *Зачислено:* {amount_text}\n"
+                        parts.append(f"   💰 *Зачислено:* {amount_text}\n")
                     else:
-                        operations_text += f"   💸 *Списано:* {abs(amount):,.2f} ₽\n"
-                
-                operations_text += "\n"
-            
-            keyboard = []
-            
-            nav_buttons = []
-            if page > 0:
-                nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"operations_page_{page-1}"))
-            
-            nav_buttons.append(InlineKeyboardButton(f"{page+1}/{total_pages}", callback_data="no_action"))
-            
-            if page < total_pages - 1:
-                nav_buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"operations_page_{page+1}"))
-            
-            if nav_buttons:
-                keyboard.append(nav_buttons)
-            
-            keyboard.append([InlineKeyboardButton("🔙 Назад в меню", callback_data="main_menu")])
-            
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
+                        parts.append(f"   💸 *Списано:* {amount_text}\n")
+
+                parts.append("\n")
+
+            operations_text = "".join(parts)
+
+            reply_markup = _build_nav_markup("operations_page", page, total_pages)
+
             await query.edit_message_text(operations_text, reply_markup=reply_markup, parse_mode='Markdown')
             
         except Exception as e:
             logging.error(f"Error in show_operations_page: {e}")
             await query.edit_message_text("❌ Ошибка при загрузке операций.")
 
-    def _get_operation_type_emoji(self, operation_type) -> str:
-        operation_type_str = str(operation_type)
-        emoji_map = {
-            "OPERATION_TYPE_BUY": "🟢",
-            "OPERATION_TYPE_SELL": "🔴", 
-            "OPERATION_TYPE_COUPON": "💰",
-            "OPERATION_TYPE_DIVIDEND": "💵",
-            "OPERATION_TYPE_BROKER_COMMISSION": "💸",
-            "OPERATION_TYPE_SERVICE_COMMISSION": "⚖️",
-            "OPERATION_TYPE_TAX": "🏛️",
-            "OPERATION_TYPE_TAX_DIVIDEND": "🏛️",
-            "OPERATION_TYPE_TAX_COUPON": "🏛️"
-        }
-        
-        for key, emoji in emoji_map.items():
-            if key in operation_type_str:
-                return emoji
-                
-        return "📄"
-
     def _get_position_emoji(self, position) -> str:
-        name_lower = position['name'].lower()
-        type_lower = str(position['type']).lower()
-        
-        if 'акция' in name_lower or 'share' in type_lower:
-            return "📈"
-        elif 'облигация' in name_lower or 'bond' in type_lower:
-            return "🎯"
-        elif 'фонд' in name_lower or 'etf' in type_lower:
-            return "📊"
-        elif 'валюта' in name_lower or 'currency' in type_lower:
-            return "💱"
-        else:
-            return "💼"
+        # Нижний регистр подготовлен сервисом портфеля при загрузке
+        type_lower = position.get('_type_lc') or str(position['type']).lower()
+        emoji = _POSITION_TYPE_EMOJIS.get(type_lower)
+        if emoji:
+            return emoji
+
+        name_lower = position.get('_name_lc') or position['name'].lower()
+        for keyword, keyword_emoji in _POSITION_NAME_EMOJIS:
+            if keyword in name_lower:
+                return keyword_emoji
+        return "💼"
         
\ No newline at end of file
@@ -1,9 +1,12 @@
 import logging
+import time
+from contextlib import asynccontextmanager
 from typing import List, Dict, Optional
 from decimal import Decimal
 from datetime import datetime, timedelta
 import asyncio
 import httpx
+import numpy as np
 from tinkoff.invest import AsyncClient
 
 from config import Config
@@ -15,21 +18,88 @@ from services.chart_service import ChartService
 
 logger = logging.getLogger(__name__)
 
+# Время жизни кэша сводки портфеля и его максимальный размер
+_PORTFOLIO_CACHE_TTL = 30
+_PORTFOLIO_CACHE_MAX = 128
+
+# Сколько ждем данные по одному счету, прежде чем отдать частичную сводку
+_ACCOUNT_TIMEOUT = 8.0
+
 class TinkoffInvestmentsClient:
     def __init__(self, api_token: str):
         self.token = api_token
         self.logger = logger
 
-        self.account_service = AccountService(self.token)
-        self.portfolio_service = PortfolioService(self.token)
-        self.operation_service = OperationService(self.token)
-        self.instrument_service = InstrumentService(self.token)
-        self.chart_service = ChartService(self.token)
+        # Одно долгоживущее gRPC-соединение на клиента: сервисы не
+        # проходят TLS-рукопожатие на каждый вызов
+        self._grpc_cm = None
+        self._grpc = None
+        self._grpc_lock = asyncio.Lock()
+
+        self.account_service = AccountService(self.token, client_provider=self._shared_grpc)
+        self.portfolio_service = PortfolioService(self.token, client_provider=self._shared_grpc)
+        self.operation_service = OperationService(self.token, client_provider=self._shared_grpc)
+        self.instrument_service = InstrumentService(self.token, client_provider=self._shared_grpc)
+        self.chart_service = ChartService(self.token, client_provider=self._shared_grpc)
+
+        # Кэш сводок портфеля: (счета...) -> (монотонное время, сводка)
+        self._portfolio_cache: Dict[tuple, tuple] = {}
+        # Запросы в полете: двойной клик ждет уже запущенный fan-out,
+        # а не порождает второй такой же к Tinkoff
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+    def invalidate_portfolio_cache(self):
+        """Сбросить кэш сводок портфеля (например, при явном обновлении)"""
+        self._portfolio_cache.clear()
+
+    async def _coalesce(self, key: tuple, fetch):
+        """Склеить конкурентные одинаковые запросы в один сетевой вызов"""
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await inflight
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fetch()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Если никто больше не ждал, не даем asyncio ругаться
+            # на невостребованное исключение
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _get_grpc(self):
+        """Ленивое открытие общего gRPC-соединения"""
+        if self._grpc is None:
+            async with self._grpc_lock:
+                if self._grpc is None:
+                    self._grpc_cm = AsyncClient(self.token)
+                    self._grpc = await self._grpc_cm.__aenter__()
+        return self._grpc
+
+    @asynccontextmanager
+    async def _shared_grpc(self):
+        """Контекст с общим клиентом; соединение живет до aclose()"""
+        yield await self._get_grpc()
+
+    async def aclose(self):
+        """Закрыть общее gRPC-соединение (смена токена, остановка)"""
+        if self._grpc_cm is not None:
+            cm, self._grpc_cm, self._grpc = self._grpc_cm, None, None
+            try:
+                await cm.__aexit__(None, None, None)
+            except Exception as e:
+                logger.warning(f"Error closing Tinkoff client: {e}")
 
     async def validate_token(self) -> bool:
         """Проверка валидности API токена"""
         try:
-            async with AsyncClient(self.token) as client:
+            async with self._shared_grpc() as client:
                 await client.users.get_accounts()
                 return True
         except Exception as e:
@@ -62,40 +132,17 @@ class TinkoffInvestmentsClient:
     async def get_portfolio_summary(self, account_ids: List[str]) -> Dict:
         """Получение сводной информации по портфелю для нескольких счетов"""
         try:
-            tasks = []
-            for account_id in account_ids:
-                task = self.portfolio_service.get_portfolio_summary(account_id, self.instrument_service)
-                tasks.append(task)
-            
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            total_value = 0.0
-            all_positions = []
-            stocks = []
-            bonds = []
-            etfs = []
-            currencies = []
-            
-            for result in results:
-                if isinstance(result, Exception):
-                    logger.error(f"Error getting portfolio: {result}")
-                    continue
-                    
-                total_value += result['total_value']
-                all_positions.extend(result['positions'])
-                stocks.extend(result['stocks'])
-                bonds.extend(result['bonds'])
-                etfs.extend(result['etfs'])
-                currencies.extend(result['currencies'])
-            
-            return {
-                'total_value': total_value,
-                'positions': all_positions,
-                'stocks': stocks,
-                'bonds': bonds,
-                'etfs': etfs,
-                'currencies': currencies
-            }
+            # Пагинация и повторные открытия меню в пределах TTL
+            # переиспользуют один сетевой обход счетов
+            cache_key = tuple(sorted(account_ids))
+            cached = self._portfolio_cache.get(cache_key)
+            if cached and time.monotonic() - cached[0] < _PORTFOLIO_CACHE_TTL:
+                return cached[1]
+
+            return await self._coalesce(
+                ('portfolio', cache_key),
+                lambda: self._fetch_portfolio_summary(account_ids, cache_key)
+            )
         except httpx.ReadError as e:
             logger.error(f"Network error while getting portfolio: {e}")
             raise
@@ -110,10 +157,93 @@ class TinkoffInvestmentsClient:
                 'currencies': []
             }
 
+    async def _fetch_portfolio_summary(self, account_ids: List[str], cache_key: tuple) -> Dict:
+        """Собственно сетевой обход счетов и агрегация сводки"""
+        # Таймаут на счет: один медленный счет не держит всю сводку,
+        # остальные данные отдаем как частичные
+        tasks = []
+        for account_id in account_ids:
+            task = asyncio.wait_for(
+                self.portfolio_service.get_portfolio_summary(account_id, self.instrument_service),
+                timeout=_ACCOUNT_TIMEOUT
+            )
+            tasks.append(task)
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        total_value = 0.0
+        all_positions = []
+        stocks = []
+        bonds = []
+        etfs = []
+        currencies = []
+        partial = False
+
+        for account_id, result in zip(account_ids, results):
+            if isinstance(result, asyncio.TimeoutError):
+                logger.warning(f"Portfolio fetch timed out for account {account_id}")
+                partial = True
+                continue
+            if isinstance(result, Exception):
+                logger.error(f"Error getting portfolio: {result}")
+                partial = True
+                continue
+
+            total_value += result['total_value']
+            all_positions.extend(result['positions'])
+            stocks.extend(result['stocks'])
+            bonds.extend(result['bonds'])
+            etfs.extend(result['etfs'])
+            currencies.extend(result['currencies'])
+
+        summary = {
+            'total_value': total_value,
+            'positions': all_positions,
+            # Стоимости позиций отдельным float64-массивом: топ-K и
+            # сортировки в обработчиках идут через C-уровень numpy
+            'values': np.fromiter(
+                (pos['value'] for pos in all_positions),
+                dtype=np.float64,
+                count=len(all_positions)
+            ),
+            'stocks': stocks,
+            'bonds': bonds,
+            'etfs': etfs,
+            'currencies': currencies,
+            'partial': partial
+        }
+
+        # Частичные сводки не кэшируем: повторный запрос попробует
+        # собрать полные данные, а не залипнет на урезанных
+        if not partial:
+            self._portfolio_cache[cache_key] = (time.monotonic(), summary)
+            # Простая LRU-граница: выбрасываем самые старые записи
+            while len(self._portfolio_cache) > _PORTFOLIO_CACHE_MAX:
+                self._portfolio_cache.pop(next(iter(self._portfolio_cache)))
+
+        return summary
+
+    async def get_operations(self, account_ids: List[str], from_date: datetime, to_date: datetime) -> List:
+        """Получение операций за период для нескольких счетов"""
+        try:
+            return await self._coalesce(
+                ('operations', tuple(sorted(account_ids)), from_date, to_date),
+                lambda: self.operation_service.get_operations_for_accounts(account_ids, from_date, to_date)
+            )
+        except httpx.ReadError as e:
+            logger.error(f"Network error while getting operations: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Error getting operations: {e}")
+            return []
+
     async def calculate_income(self, account_ids: List[str], period: str) -> Dict[str, Decimal]:
         """Расчет дохода за указанный период для нескольких счетов"""
         try:
-            return await self.operation_service.calculate_income_for_accounts(account_ids, period)
+            return await self._coalesce(
+                ('income', tuple(sorted(account_ids)), period),
+                lambda: self.operation_service.calculate_income_for_accounts(account_ids, period)
+            )
         except httpx.ReadError as e:
             logger.error(f"Network error while calculating income: {e}")
             raise
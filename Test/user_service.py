@@ -1,54 +1,173 @@
 import os
 import json
-import aiofiles
+import asyncio
+import aiosqlite
 import logging
 from typing import Optional, List, Dict
 from config import Config
 from encryption_service import EncryptionService
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+
+def _loads(raw: bytes) -> Dict:
+    """Разбор JSON: orjson заметно быстрее на горячем пути чтения"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _dumps(data: Dict) -> bytes:
+    """Сериализация JSON сразу в bytes для записи в бинарном режиме"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+
 class UserService:
     def __init__(self):
         self.data_dir = Config.USER_DATA_DIR
+        self.db_path = os.path.join(self.data_dir, "users.db")
         self.encryption_service = EncryptionService(Config.ENCRYPTION_KEY)
+        # Кэш данных пользователей (с уже расшифрованным токеном):
+        # каждый callback дергает get_user_data, и без кэша это
+        # чтение файла + Fernet-расшифровка на каждый клик
+        self._cache: Dict[int, Dict] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        # Единая SQLite-база вместо файла на пользователя:
+        # один дескриптор и никаких stat/open на каждый запрос
+        self._db: Optional[aiosqlite.Connection] = None
+        self._db_lock = asyncio.Lock()
 
     def _get_user_file_path(self, user_id: int) -> str:
-        """Получить путь к файлу данных пользователя"""
+        """Получить путь к старому JSON-файлу данных пользователя"""
         return os.path.join(self.data_dir, f"user_{user_id}.json")
 
+    async def _get_db(self) -> aiosqlite.Connection:
+        """Ленивое открытие соединения с базой (WAL для конкурентных чтений)"""
+        if self._db is not None:
+            return self._db
+        async with self._db_lock:
+            if self._db is None:
+                db = await aiosqlite.connect(self.db_path)
+                await db.execute("PRAGMA journal_mode=WAL")
+                await db.execute("PRAGMA synchronous=NORMAL")
+                await db.execute(
+                    "CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, blob BLOB)"
+                )
+                await db.commit()
+                self._db = db
+            return self._db
+
+    async def close(self):
+        """Закрыть соединение с базой при остановке"""
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def _get_lock(self, user_id: int) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
     async def get_user_data(self, user_id: int) -> Dict:
         """Получить все данные пользователя"""
+        cached = self._cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+
+        # Блокировка на пользователя: параллельные обработчики не читают
+        # и не расшифровывают один и тот же файл наперегонки
+        async with self._get_lock(user_id):
+            cached = self._cache.get(user_id)
+            if cached is not None:
+                return dict(cached)
+
+            data = await self._read_user_data(user_id)
+            self._cache[user_id] = dict(data)
+            return data
+
+    def _decrypt_token(self, user_id: int, data: Dict) -> Dict:
+        """Расшифровать токен в прочитанных данных"""
+        if 'encrypted_api_token' in data:
+            try:
+                data['api_token'] = self.encryption_service.decrypt(data['encrypted_api_token'])
+            except Exception as e:
+                logger.error(f"Error decrypting token for user {user_id}: {e}")
+                data['api_token'] = None
+        return data
+
+    async def _read_user_data(self, user_id: int) -> Dict:
+        """Прочитать данные пользователя из базы и расшифровать токен"""
         try:
-            file_path = self._get_user_file_path(user_id)
-            if os.path.exists(file_path):
-                async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.loads(await f.read())
-                    if 'encrypted_api_token' in data:
-                        try:
-                            data['api_token'] = self.encryption_service.decrypt(data['encrypted_api_token'])
-                        except Exception as e:
-                            logger.error(f"Error decrypting token for user {user_id}: {e}")
-                            data['api_token'] = None
-                    return data
-            return {}
+            db = await self._get_db()
+            async with db.execute(
+                "SELECT blob FROM users WHERE user_id = ?", (user_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row is not None:
+                return self._decrypt_token(user_id, _loads(row[0]))
+            return await self._migrate_legacy_file(user_id)
         except Exception as e:
             logger.error(f"Error reading user data for {user_id}: {e}")
             return {}
 
+    async def _migrate_legacy_file(self, user_id: int) -> Dict:
+        """Подтянуть данные из старого JSON-файла и переложить их в базу"""
+        file_path = self._get_user_file_path(user_id)
+        if not os.path.exists(file_path):
+            return {}
+        # Одноразовая миграция на пользователя - синхронное чтение здесь
+        # не больнее соседних os.path.exists/os.remove
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        data = _loads(raw)
+        db = await self._get_db()
+        await db.execute(
+            "INSERT OR REPLACE INTO users (user_id, blob) VALUES (?, ?)",
+            (user_id, _dumps(data))
+        )
+        await db.commit()
+        os.remove(file_path)
+        logger.info(f"Migrated user {user_id} data from JSON file to SQLite")
+        return self._decrypt_token(user_id, data)
+
     async def save_user_data(self, user_id: int, data: Dict):
         """Сохранить данные пользователя"""
         try:
-            file_path = self._get_user_file_path(user_id)
-            
-            if 'api_token' in data and data['api_token']:
-                data['encrypted_api_token'] = self.encryption_service.encrypt(data['api_token'])
+            api_token = data.get('api_token')
+            if api_token:
+                cached = self._cache.get(user_id)
+                if cached and cached.get('api_token') == api_token and cached.get('encrypted_api_token'):
+                    # Токен не менялся - переиспользуем готовый шифротекст,
+                    # не гоняя Fernet (AES+HMAC) на каждое обновление счетов
+                    data['encrypted_api_token'] = cached['encrypted_api_token']
+                else:
+                    data['encrypted_api_token'] = self.encryption_service.encrypt(api_token)
                 del data['api_token']
-            
-            async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(data, ensure_ascii=False, indent=2))
+
+            db = await self._get_db()
+            await db.execute(
+                "INSERT OR REPLACE INTO users (user_id, blob) VALUES (?, ?)",
+                (user_id, _dumps(data))
+            )
+            await db.commit()
+
+            # Обновляем кэш тем же видом данных, что вернет get_user_data
+            cached = dict(data)
+            if api_token:
+                cached['api_token'] = api_token
+            self._cache[user_id] = cached
         except Exception as e:
             logger.error(f"Error saving user data for {user_id}: {e}")
+            # Не оставляем в кэше состояние, которое могло не записаться
+            self._cache.pop(user_id, None)
 
     async def set_user_api_token(self, user_id: int, api_token: str):
         """Сохранить API токен пользователя"""
@@ -75,6 +194,11 @@ class UserService:
     async def clear_user_data(self, user_id: int):
         """Очистить все данные пользователя"""
         try:
+            self._cache.pop(user_id, None)
+            db = await self._get_db()
+            await db.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+            await db.commit()
+            # На случай, если остался немигрированный старый файл
             file_path = self._get_user_file_path(user_id)
             if os.path.exists(file_path):
                 os.remove(file_path)
@@ -1,34 +1,415 @@
+import asyncio
+import functools
+import hashlib
+import json
 import logging
-import base64
-import io
 import os
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Optional
+from urllib.parse import parse_qsl
 from aiohttp import web
 import aiohttp_jinja2
 import jinja2
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from config import Config
 from user_service import UserService
 from tinkoff_client import TinkoffInvestmentsClient
 
 logger = logging.getLogger(__name__)
 
+# Время жизни мемо (токен, счета) пользователя, секунд
+_USER_CTX_TTL = 30
+
+# Пределы кэшей, ключуемых присланным клиентом user_id: протухшие
+# записи перезаписываются только при повторном обращении к тому же
+# ключу, поэтому без предела произвольные ?user_id= растили бы их
+# бесконечно
+_MAX_RESPONSE_CACHE = 512
+_MAX_USER_CTX_CACHE = 512
+
+
+def _evict_oldest(cache: Dict, limit: int):
+    """Выбросить самые старые записи, когда кэш превысил предел"""
+    while len(cache) > limit:
+        cache.pop(next(iter(cache)))
+
+# Допустимые значения периода; проверяем на входе, чтобы вглубь
+# не уходили произвольные строки
+_VALID_PERIODS = frozenset(('day', 'week', 'month', 'year', 'all_time'))
+
+
+# Максимальный размер тела POST-запроса
+_MAX_BODY_SIZE = 64 * 1024
+
+# Предел кэша клиентов по токену: каждый клиент держит gRPC-канал,
+# без ограничения кэш растет на каждый увиденный токен
+_MAX_CLIENTS = 32
+
+# Эндпоинты, которым нужны request['account_ids']; только для них
+# имеет смысл искать запасной счет походом в Tinkoff
+_ACCOUNT_PATHS = frozenset((
+    '/api/portfolio',
+    '/api/income',
+    '/api/chart/capital',
+    '/api/chart/income',
+))
+
+
+@dataclass(frozen=True)
+class _ParsedQuery:
+    # None - user_id в запросе был, но не числовой
+    user_id: Optional[int]
+    period: str
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_query(qs: str) -> _ParsedQuery:
+    """Разбор строки запроса в типизированную запись.
+
+    Дашборд опрашивает API с одними и теми же query string, поэтому
+    повторный разбор и int() почти всегда отдаются из lru_cache.
+    """
+    user_id = 0
+    period = 'week'
+    for key, value in parse_qsl(qs):
+        if key == 'user_id':
+            # Дешевая проверка вместо ValueError из int(): мусор вроде
+            # ?user_id=abc не должен доходить до машинерии исключений
+            user_id = int(value) if value.isdecimal() else None
+        elif key == 'period':
+            period = value
+    return _ParsedQuery(user_id=user_id, period=period)
+
+
+async def _load_json(request, limit=_MAX_BODY_SIZE):
+    """Прочитать и разобрать JSON-тело с ограничением размера.
+
+    request.json() не ограничивает размер тела; здесь большой blob
+    отклоняется до аллокации разобранной структуры.
+    """
+    raw = await request.read()
+    if len(raw) > limit:
+        raise web.HTTPRequestEntityTooLarge(max_size=limit, actual_size=len(raw))
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _error_body(message: str) -> bytes:
+    """Сериализованное тело ошибки; для постоянных сообщений считается
+    один раз на импорте модуля, а не на каждый ответ"""
+    if orjson is not None:
+        return orjson.dumps({'error': message})
+    return json.dumps({'error': message}).encode()
+
+
+_TOKEN_NOT_SET_BODY = _error_body('Token not set')
+_INVALID_PERIOD_BODY = _error_body('Invalid period')
+_NO_ACCOUNTS_AVAILABLE_BODY = _error_body('No accounts available')
+_NO_ACCOUNTS_SELECTED_BODY = _error_body('No accounts selected')
+_INTERNAL_ERROR_BODY = _error_body('Internal error')
+_BAD_USER_ID_BODY = _error_body('Invalid user_id')
+_CHART_FAILED_BODY = _error_body('Failed to generate chart')
+
+
+def _error_response(body: bytes, status: int) -> web.Response:
+    """Ответ-ошибка из заранее сериализованного тела"""
+    return web.Response(body=body, status=status, content_type='application/json')
+
+
+def _json_default(obj):
+    """Decimal -> float, numpy-массивы -> list при сериализации"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    tolist = getattr(obj, 'tolist', None)
+    if tolist is not None:
+        return tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _json_response(data, status=200):
+    """JSON-ответ через orjson: Decimal уходит в сериализатор напрямую,
+    без пересборки словаря на Python-уровне"""
+    if orjson is not None:
+        return web.Response(
+            body=orjson.dumps(data, default=_json_default),
+            status=status,
+            content_type='application/json'
+        )
+    return web.json_response(
+        data, status=status,
+        dumps=lambda d: json.dumps(d, default=_json_default)
+    )
+
+
+def _replay(cached, request):
+    """Собрать ответ из кэшированной тройки (body, content_type, headers).
+
+    Если у записи есть ETag и клиент прислал совпадающий If-None-Match,
+    тело не отправляется вовсе - 304 с одним заголовком.
+    """
+    body, content_type, headers = cached
+    etag = headers.get('ETag')
+    if etag and request.headers.get('If-None-Match') == etag:
+        return web.Response(status=304, headers={'ETag': etag})
+    return web.Response(body=body, content_type=content_type, headers=headers)
+
+
+def _cached(endpoint: str, ttl: float):
+    """Кэш готовых ответов API по (эндпоинт, user_id, period).
+
+    Счета меняются редко, сводки терпят задержку в секунды, а графики -
+    в минуты, поэтому повторные обновления дашборда отдаются из памяти
+    без похода в Tinkoff. При ошибке апстрима отдаем протухший ответ,
+    если он есть, вместо 500.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, request):
+            pq = _parse_query(request.query_string)
+            key = (endpoint, pq.user_id, pq.period)
+            now = time.monotonic()
+            entry = self._response_cache.get(key)
+            if entry and now - entry[0] < ttl:
+                return _replay(entry[1:], request)
+
+            # Холодный кэш + залп одинаковых запросов: остальные ждут
+            # результат первого вместо собственных походов в Tinkoff
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                result = await inflight
+                if result is not None:
+                    return _replay(result, request)
+                return _error_response(_INTERNAL_ERROR_BODY, 500)
+
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[key] = future
+            try:
+                resp = None
+                try:
+                    resp = await func(self, request)
+                except Exception as e:
+                    logger.error(f"Error in cached handler {endpoint}: {e}")
+
+                if resp is not None and resp.status == 200 and resp.body is not None:
+                    body = bytes(resp.body)
+                    headers = {
+                        name: resp.headers[name]
+                        for name in ('ETag', 'Cache-Control')
+                        if name in resp.headers
+                    }
+                    self._response_cache[key] = (now, body, resp.content_type, headers)
+                    _evict_oldest(self._response_cache, _MAX_RESPONSE_CACHE)
+                    future.set_result((body, resp.content_type, headers))
+                    return resp
+
+                if resp is not None and resp.status == 304:
+                    # Данные не изменились: клиенту уходит 304, а
+                    # ожидающим - прежняя запись кэша, если она есть
+                    if entry is not None:
+                        future.set_result(entry[1:])
+                    return resp
+
+                if entry is not None:
+                    logger.warning(f"Serving stale cached response for {endpoint}")
+                    future.set_result(entry[1:])
+                    return _replay(entry[1:], request)
+
+                future.set_result(None)
+                if resp is not None:
+                    return resp
+                return _error_response(_INTERNAL_ERROR_BODY, 500)
+            finally:
+                self._inflight.pop(key, None)
+                if not future.done():
+                    future.set_result(None)
+        return wrapper
+    return decorator
+
+
 class WebApp:
     def __init__(self):
         self.app = web.Application()
         self.user_service = UserService()
-        
+        # Токен из конфига не меняется на лету - читаем атрибут один раз
+        self._fallback_token = Config.TINKOFF_API_TOKEN
+
+        # Кэш клиентов по токену: gRPC-соединение и внутренние кэши
+        # клиента живут между HTTP-запросами, а не создаются на каждый
+        self._clients: Dict[str, TinkoffInvestmentsClient] = {}
+        # Кэш готовых HTTP-ответов: (эндпоинт, user_id, period) -> ответ
+        self._response_cache: Dict[tuple, tuple] = {}
+        # Мемо (токен, счета) по user_id: два обращения к хранилищу
+        # на каждый запрос дашборда превращаются в одно чтение из памяти
+        self._user_ctx_cache: Dict[int, tuple] = {}
+        # Мемо запасного списка счетов по токену (когда ничего не выбрано)
+        self._fallback_accounts_cache: Dict[str, tuple] = {}
+        # Запросы в полете по ключу кэша ответов (singleflight)
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+        self.app.middlewares.append(self._resolve_ctx)
+        self.app.middlewares.append(self._compress_ctx)
+
         # Настройка шаблонов с абсолютным путем
         current_dir = Path(__file__).parent
         templates_dir = current_dir / 'templates'
-        
+
         aiohttp_jinja2.setup(
-            self.app, 
+            self.app,
             loader=jinja2.FileSystemLoader(str(templates_dir))
         )
-        
+
+        # Компилируем шаблоны один раз на старте: без auto_reload Jinja
+        # не проверяет mtime файлов, а байткод-кэш переживает перезапуски
+        env = aiohttp_jinja2.get_env(self.app)
+        env.auto_reload = False
+        env.bytecode_cache = jinja2.FileSystemBytecodeCache()
+        for name in env.list_templates(extensions=['html']):
+            env.get_template(name)
+        self._index_tpl = env.get_template('index.html')
+
         self.setup_routes()
-        
+        self.app.on_cleanup.append(self._close_clients)
+
+    def _client(self, token: str) -> TinkoffInvestmentsClient:
+        """Получить (или создать) клиент Tinkoff для токена.
+
+        Кэш ограничен _MAX_CLIENTS: при переполнении закрывается давно
+        не использованный клиент вместе с его gRPC-каналом. Порядок
+        dict поддерживается как LRU переносом ключа в конец на каждое
+        обращение.
+        """
+        client = self._clients.pop(token, None)
+        if client is None:
+            if len(self._clients) >= _MAX_CLIENTS:
+                old_token = next(iter(self._clients))
+                old_client = self._clients.pop(old_token)
+                try:
+                    asyncio.get_running_loop().create_task(old_client.aclose())
+                except RuntimeError:
+                    pass
+            client = TinkoffInvestmentsClient(token)
+        self._clients[token] = client
+        return client
+
+    async def _close_clients(self, app):
+        """Закрыть все клиенты при остановке приложения"""
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    def _invalidate_user(self, user_id: int):
+        """Сбросить мемо контекста и кэшированные ответы пользователя.
+
+        Вызывается после явного изменения токена или набора счетов:
+        иначе дашборд после сохранения еще несколько TTL показывал бы
+        ответы, собранные по старым данным.
+        """
+        self._user_ctx_cache.pop(user_id, None)
+        for key in [k for k in self._response_cache if k[1] == user_id]:
+            del self._response_cache[key]
+
+    async def _user_ctx(self, user_id: int):
+        """Токен и выбранные счета пользователя с коротким TTL"""
+        now = time.monotonic()
+        entry = self._user_ctx_cache.get(user_id)
+        if entry and now - entry[0] < _USER_CTX_TTL:
+            return entry[1], entry[2]
+
+        # Чтения независимы - выполняем их параллельно
+        token, account_ids = await asyncio.gather(
+            self.user_service.get_user_api_token(user_id),
+            self.user_service.get_user_accounts(user_id)
+        )
+        self._user_ctx_cache[user_id] = (now, token, account_ids)
+        _evict_oldest(self._user_ctx_cache, _MAX_USER_CTX_CACHE)
+        return token, account_ids
+
+    async def _fallback_account_ids(self, user_id: int, token: str):
+        """Первый доступный счет, когда пользователь ничего не выбрал.
+
+        Результат мемоизируется на 60 секунд по токену, чтобы второй
+        открытый таб не повторял лишний поход в Tinkoff. Найденный счет
+        сразу сохраняется за пользователем: следующий эндпоинт прочитает
+        его из хранилища и не пойдет в Tinkoff вообще.
+        """
+        now = time.monotonic()
+        entry = self._fallback_accounts_cache.get(token)
+        if entry and now - entry[0] < 60:
+            return entry[1]
+
+        accounts = await self._client(token).get_accounts()
+        account_ids = [accounts[0]['id']] if accounts else []
+        self._fallback_accounts_cache[token] = (now, account_ids)
+
+        if user_id and account_ids:
+            try:
+                await self.user_service.set_user_accounts(user_id, account_ids)
+                self._user_ctx_cache.pop(user_id, None)
+            except Exception as e:
+                logger.warning(f"Error persisting fallback accounts for user {user_id}: {e}")
+
+        return account_ids
+
+    @web.middleware
+    async def _resolve_ctx(self, request, handler):
+        """Разрешить токен и счета один раз для всех GET /api/ запросов.
+
+        Раньше каждый обработчик повторял одни и те же ~15 строк
+        преамбулы; теперь она выполняется здесь, а обработчики читают
+        request['token'] и request['account_ids'].
+        """
+        if request.method == 'GET' and request.path.startswith('/api/'):
+            try:
+                user_id = _parse_query(request.query_string).user_id
+                if user_id is None:
+                    return _error_response(_BAD_USER_ID_BODY, 400)
+                token, account_ids = await self._user_ctx(user_id)
+
+                if not token:
+                    # Для тестирования используем токен из конфига
+                    token = self._fallback_token
+                    if not token:
+                        return _error_response(_TOKEN_NOT_SET_BODY, 400)
+
+                if not account_ids and request.path in _ACCOUNT_PATHS:
+                    account_ids = await self._fallback_account_ids(user_id, token)
+
+                request['user_id'] = user_id
+                request['token'] = token
+                request['account_ids'] = account_ids
+            except Exception as e:
+                logger.error(f"Error resolving request context: {e}")
+                return web.json_response({'error': str(e)}, status=500)
+
+        return await handler(request)
+
+    @web.middleware
+    async def _compress_ctx(self, request, handler):
+        """Сжимать крупные ответы, если клиент поддерживает gzip.
+
+        PNG уже сжат - его не трогаем, мелкие ответы не стоят накладных
+        расходов на компрессию.
+        """
+        response = await handler(request)
+        if (
+            'gzip' in request.headers.get('Accept-Encoding', '')
+            and isinstance(response, web.Response)
+            and response.body is not None
+            and len(response.body) > 1024
+            and response.content_type != 'image/png'
+        ):
+            response.enable_compression(web.ContentCoding.gzip)
+        return response
+
     def setup_routes(self):
         """Настройка маршрутов"""
         self.app.router.add_get('/', self.index)
@@ -40,160 +421,138 @@ class WebApp:
         self.app.router.add_post('/api/set_token', self.set_token)
         self.app.router.add_post('/api/set_accounts', self.set_accounts)
         
-    @aiohttp_jinja2.template('index.html')
     async def index(self, request):
         """Главная страница Mini App"""
-        return {}
+        # Шаблон уже скомпилирован в __init__ - рендерим напрямую,
+        # без поиска шаблона декоратором на каждый запрос
+        return web.Response(
+            text=self._index_tpl.render({}),
+            content_type='text/html'
+        )
     
+    @_cached('accounts', ttl=60)
     async def get_accounts(self, request):
         """Получение списка счетов"""
         try:
-            user_id = int(request.query.get('user_id', '0'))
-            token = await self.user_service.get_user_api_token(user_id)
-            
-            if not token:
-                # Для тестирования используем токен из конфига
-                token = Config.TINKOFF_API_TOKEN
-                if not token:
-                    return web.json_response({'error': 'Token not set'}, status=400)
-                
-            client = TinkoffInvestmentsClient(token)
+            client = self._client(request['token'])
             accounts = await client.get_accounts()
             
-            return web.json_response({'accounts': accounts})
+            return _json_response({'accounts': accounts})
             
         except Exception as e:
             logger.error(f"Error getting accounts: {e}")
             return web.json_response({'error': str(e)}, status=500)
     
+    @_cached('portfolio', ttl=15)
     async def get_portfolio(self, request):
         """Получение портфеля"""
         try:
-            user_id = int(request.query.get('user_id', '0'))
-            token = await self.user_service.get_user_api_token(user_id)
-            
-            if not token:
-                token = Config.TINKOFF_API_TOKEN
-                if not token:
-                    return web.json_response({'error': 'Token not set'}, status=400)
-                
-            account_ids = await self.user_service.get_user_accounts(user_id)
+            account_ids = request['account_ids']
             if not account_ids:
-                # Для тестирования используем первый доступный счет
-                client = TinkoffInvestmentsClient(token)
-                accounts = await client.get_accounts()
-                if accounts:
-                    account_ids = [accounts[0]['id']]
-                else:
-                    return web.json_response({'error': 'No accounts available'}, status=400)
-                
-            client = TinkoffInvestmentsClient(token)
+                return _error_response(_NO_ACCOUNTS_AVAILABLE_BODY, 400)
+
+            client = self._client(request['token'])
             portfolio = await client.get_portfolio_summary(account_ids)
-            
-            return web.json_response(portfolio)
+
+            return _json_response(portfolio)
             
         except Exception as e:
             logger.error(f"Error getting portfolio: {e}")
             return web.json_response({'error': str(e)}, status=500)
     
+    @_cached('income', ttl=15)
     async def get_income(self, request):
         """Получение доходности"""
         try:
-            user_id = int(request.query.get('user_id', '0'))
-            period = request.query.get('period', 'week')
-            token = await self.user_service.get_user_api_token(user_id)
-            
-            if not token:
-                token = Config.TINKOFF_API_TOKEN
-                if not token:
-                    return web.json_response({'error': 'Token not set'}, status=400)
-                
-            account_ids = await self.user_service.get_user_accounts(user_id)
+            period = _parse_query(request.query_string).period
+            if period not in _VALID_PERIODS:
+                return _error_response(_INVALID_PERIOD_BODY, 400)
+            account_ids = request['account_ids']
             if not account_ids:
-                client = TinkoffInvestmentsClient(token)
-                accounts = await client.get_accounts()
-                if accounts:
-                    account_ids = [accounts[0]['id']]
-                else:
-                    return web.json_response({'error': 'No accounts selected'}, status=400)
-                
-            client = TinkoffInvestmentsClient(token)
+                return _error_response(_NO_ACCOUNTS_SELECTED_BODY, 400)
+
+            client = self._client(request['token'])
             income_data = await client.calculate_income(account_ids, period)
-            
-            # Конвертируем Decimal в float для JSON
-            income_data = {k: float(v) if hasattr(v, '__float__') else v 
-                         for k, v in income_data.items()}
-            
-            return web.json_response(income_data)
+
+            # Decimal конвертирует сам сериализатор - dict не пересобираем
+            return _json_response(income_data)
             
         except Exception as e:
             logger.error(f"Error getting income: {e}")
             return web.json_response({'error': str(e)}, status=500)
     
+    @_cached('chart_capital', ttl=120)
     async def get_capital_chart(self, request):
         """Получение графика капитала"""
         try:
-            user_id = int(request.query.get('user_id', '0'))
-            period = request.query.get('period', 'week')
-            token = await self.user_service.get_user_api_token(user_id)
-            
-            if not token:
-                token = Config.TINKOFF_API_TOKEN
-                if not token:
-                    return web.json_response({'error': 'Token not set'}, status=400)
-                
-            account_ids = await self.user_service.get_user_accounts(user_id)
+            period = _parse_query(request.query_string).period
+            if period not in _VALID_PERIODS:
+                return _error_response(_INVALID_PERIOD_BODY, 400)
+            account_ids = request['account_ids']
             if not account_ids:
-                client = TinkoffInvestmentsClient(token)
-                accounts = await client.get_accounts()
-                if accounts:
-                    account_ids = [accounts[0]['id']]
-                else:
-                    return web.json_response({'error': 'No accounts selected'}, status=400)
-                
-            client = TinkoffInvestmentsClient(token)
-            chart = await client.generate_capital_chart(account_ids, period)
-            
+                return _error_response(_NO_ACCOUNTS_SELECTED_BODY, 400)
+
+            client = self._client(request['token'])
+            series = await client.chart_service.get_capital_series(account_ids, period)
+            if not series:
+                return _error_response(_CHART_FAILED_BODY, 500)
+
+            # ETag по входным данным: если ряд не изменился с прошлого
+            # опроса, дорогая отрисовка и передача PNG не нужны
+            etag = hashlib.blake2b(repr(series).encode(), digest_size=8).hexdigest()
+            if request.headers.get('If-None-Match') == etag:
+                return web.Response(status=304, headers={'ETag': etag})
+
+            chart = await client.chart_service.render_capital_chart(series, period)
             if chart:
-                chart_data = base64.b64encode(chart.getvalue()).decode()
-                return web.json_response({'chart': chart_data})
+                # PNG отдаем как есть: без base64 (+33% к размеру) и
+                # без декодирования на клиенте, браузер кэширует сам
+                return web.Response(
+                    body=chart.getvalue(),
+                    content_type='image/png',
+                    headers={'ETag': etag, 'Cache-Control': 'private, max-age=30'}
+                )
             else:
-                return web.json_response({'error': 'Failed to generate chart'}, status=500)
-                
+                return _error_response(_CHART_FAILED_BODY, 500)
+
         except Exception as e:
             logger.error(f"Error getting capital chart: {e}")
             return web.json_response({'error': str(e)}, status=500)
     
+    @_cached('chart_income', ttl=120)
     async def get_income_chart(self, request):
         """Получение графика доходности"""
         try:
-            user_id = int(request.query.get('user_id', '0'))
-            period = request.query.get('period', 'week')
-            token = await self.user_service.get_user_api_token(user_id)
-            
-            if not token:
-                token = Config.TINKOFF_API_TOKEN
-                if not token:
-                    return web.json_response({'error': 'Token not set'}, status=400)
-                
-            account_ids = await self.user_service.get_user_accounts(user_id)
+            period = _parse_query(request.query_string).period
+            if period not in _VALID_PERIODS:
+                return _error_response(_INVALID_PERIOD_BODY, 400)
+            account_ids = request['account_ids']
             if not account_ids:
-                client = TinkoffInvestmentsClient(token)
-                accounts = await client.get_accounts()
-                if accounts:
-                    account_ids = [accounts[0]['id']]
-                else:
-                    return web.json_response({'error': 'No accounts selected'}, status=400)
-                
-            client = TinkoffInvestmentsClient(token)
-            chart = await client.generate_income_chart(account_ids, period)
-            
+                return _error_response(_NO_ACCOUNTS_SELECTED_BODY, 400)
+
+            client = self._client(request['token'])
+            series = await client.chart_service.get_income_series(account_ids, period)
+            if not series:
+                return _error_response(_CHART_FAILED_BODY, 500)
+
+            # ETag по входным данным: если ряд не изменился с прошлого
+            # опроса, дорогая отрисовка и передача PNG не нужны
+            etag = hashlib.blake2b(repr(series).encode(), digest_size=8).hexdigest()
+            if request.headers.get('If-None-Match') == etag:
+                return web.Response(status=304, headers={'ETag': etag})
+
+            chart = await client.chart_service.render_income_chart(series, period)
             if chart:
-                chart_data = base64.b64encode(chart.getvalue()).decode()
-                return web.json_response({'chart': chart_data})
+                # PNG отдаем как есть: без base64 (+33% к размеру) и
+                # без декодирования на клиенте, браузер кэширует сам
+                return web.Response(
+                    body=chart.getvalue(),
+                    content_type='image/png',
+                    headers={'ETag': etag, 'Cache-Control': 'private, max-age=30'}
+                )
             else:
-                return web.json_response({'error': 'Failed to generate chart'}, status=500)
-                
+                return _error_response(_CHART_FAILED_BODY, 500)
+
         except Exception as e:
             logger.error(f"Error getting income chart: {e}")
             return web.json_response({'error': str(e)}, status=500)
@@ -201,18 +560,30 @@ class WebApp:
     async def set_token(self, request):
         """Установка API токена"""
         try:
-            data = await request.json()
-            user_id = int(data.get('user_id', '0'))
+            data = await _load_json(request)
+            uid_str = str(data.get('user_id', '0'))
+            if not uid_str.isdecimal():
+                return _error_response(_BAD_USER_ID_BODY, 400)
+            user_id = int(uid_str)
             token = data['token']
-            
+
+            # Запасной счет старого токена больше не актуален
+            old_token = await self.user_service.get_user_api_token(user_id)
+            if old_token:
+                self._fallback_accounts_cache.pop(old_token, None)
+
             await self.user_service.set_user_api_token(user_id, token)
-            
+            # Мемо и кэш ответов устарели - токен изменился
+            self._invalidate_user(user_id)
+
             # Проверяем токен
-            client = TinkoffInvestmentsClient(token)
+            client = self._client(token)
             is_valid = await client.validate_token()
             
             return web.json_response({'valid': is_valid})
             
+        except web.HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error setting token: {e}")
             return web.json_response({'error': str(e)}, status=500)
@@ -220,19 +591,35 @@ class WebApp:
     async def set_accounts(self, request):
         """Установка выбранных счетов"""
         try:
-            data = await request.json()
-            user_id = int(data.get('user_id', '0'))
+            data = await _load_json(request)
+            uid_str = str(data.get('user_id', '0'))
+            if not uid_str.isdecimal():
+                return _error_response(_BAD_USER_ID_BODY, 400)
+            user_id = int(uid_str)
             account_ids = data['account_ids']
             
             await self.user_service.set_user_accounts(user_id, account_ids)
-            
+            # Мемо и кэш ответов устарели - набор счетов изменился
+            self._invalidate_user(user_id)
+
             return web.json_response({'success': True})
             
+        except web.HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error setting accounts: {e}")
             return web.json_response({'error': str(e)}, status=500)
     
     def run(self, host='localhost', port=8080):
         """Запуск веб-приложения"""
-        web.run_app(self.app, host=host, port=port)
+        # Длинный keep-alive: опрашивающий Mini App переиспользует
+        # соединение вместо нового рукопожатия; access-лог на каждый
+        # запрос на горячем пути не нужен
+        web.run_app(
+            self.app,
+            host=host,
+            port=port,
+            keepalive_timeout=120,
+            access_log=None
+        )
         
\ No newline at end of file
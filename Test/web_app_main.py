@@ -1,17 +1,43 @@
 import logging
+import logging.handlers
+import queue
 from web_app import WebApp
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# uvloop заметно быстрее штатного цикла событий; без него работаем как раньше
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    uvloop = None
+
+
+def _setup_logging():
+    """Логирование через очередь: обработчики запросов только кладут
+    запись в очередь, а запись в stderr делает фоновый поток - всплеск
+    ошибок не блокирует цикл событий на I/O."""
+    log_queue = queue.Queue(-1)
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    ))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
+
 
 def main():
     """Запуск Mini App"""
+    listener = _setup_logging()
     print("🌐 Запуск Mini App...")
     web_app = WebApp()
-    web_app.run(host='0.0.0.0', port=8080)
+    try:
+        web_app.run(host='0.0.0.0', port=8080)
+    finally:
+        listener.stop()
 
 if __name__ == "__main__":
     main()